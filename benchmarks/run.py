@@ -0,0 +1,144 @@
+# python -m benchmarks.run --days 1 7 30 365 --passes 6 24 --output bench.json
+from time import perf_counter
+
+import os
+import sys
+import json
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import numpy as np
+
+from python import timeline
+from python.sweep import build_experiment
+from python.utils import csvtoparameters
+from . import scenario
+
+schedules = {
+    'idle': [],
+    'acquisition': ['acquisition'],
+    'transfer': ['acquisition', 'transfer'],
+    'download': ['acquisition', 'transfer', 'download'],
+}
+csv_names = ['input_power', 'total_load_power', ['batteries', 'SOC'], ['load_current', 3.3]]
+components_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'components.csv')
+
+
+def measure(func, memory: bool):
+    # wall time, or peak traced allocation when memory is set (tracing slows the run down)
+    if memory:
+        tracemalloc.start()
+    start = perf_counter()
+    result = func()
+    seconds = perf_counter() - start
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def cases(paths: dict, days: float, modes: list, skip: int, max_tick_days: float, memory: bool, folder: str):
+    records = list()
+
+    def record(case, seconds, peak, **fields):
+        entry = dict(fields, case=case)
+        entry['peak_bytes' if memory else 'seconds'] = peak if memory else seconds
+        records.append(entry)
+
+    # one day of margin so a full day() still fits after skiptime
+    with scenario.mission(days + 1):
+        data = scenario.load(paths)
+        data['GS'] = [data.pop('GS_0'), data.pop('GS_1')]
+        data['components'] = csvtoparameters(components_file)
+
+        timeline.clear_cache()
+        experiment, seconds, peak = measure(lambda: build_experiment(data, None, folder), memory)
+        record('construction', seconds, peak)
+
+        _, seconds, peak = measure(lambda: (experiment.reset(), experiment.skiptime(skip)), memory)
+        record('skiptime', seconds, peak)
+
+        for mode in modes:
+            for name, schedule in schedules.items():
+                run = experiment.fork()
+                simulated, seconds, peak = measure(lambda: run.day(name, schedule, 0, mode=mode), memory)
+                record('day', seconds, peak, mode=mode, schedule=name, simulated=simulated)
+
+            _, seconds, peak = measure(lambda: run.orbit_energy('input_power'), memory)
+            record('orbit_energy', seconds, peak, mode=mode)
+            _, seconds, peak = measure(lambda: run.csv(csv_names), memory)
+            record('csv', seconds, peak, mode=mode)
+            _, seconds, peak = measure(run.csv_thermal, memory)
+            record('csv_thermal', seconds, peak, mode=mode)
+
+            if mode == 'event' or days <= max_tick_days:
+                run = experiment.fork()
+                simulated, seconds, peak = measure(lambda: run.mission('mission', mode=mode), memory)
+                record('mission', seconds, peak, mode=mode, simulated=simulated)
+                _, seconds, peak = measure(lambda: run.orbit_energy('input_power'), memory)
+                record('mission_orbit_energy', seconds, peak, mode=mode)
+
+    return records
+
+
+def benchmark(days: list,
+              passes: list,
+              modes: list = ('tick', 'event'),
+              skip: int = 3600 * 8,
+              max_tick_days: float = 7,
+              memory: bool = True,
+              seed: int = 0):
+
+    records = list()
+    with tempfile.TemporaryDirectory() as folder:
+        for d in days:
+            for p in passes:
+                paths, seconds, _ = measure(lambda: scenario.generate(os.path.join(folder, 'stk'), d + 1, p, seed=seed), False)
+                scenario_fields = {'days': d, 'passes': p}
+                results = cases(paths, d, list(modes), skip, max_tick_days, False, folder)
+                if memory:
+                    peaks = cases(paths, d, list(modes), skip, max_tick_days, True, folder)
+                    for result, peak in zip(results, peaks):
+                        result['peak_bytes'] = peak['peak_bytes']
+                for result in results:
+                    if 'simulated' in result:
+                        result['throughput'] = result['simulated'] / result['seconds']
+                    records.append(dict(scenario_fields, **result))
+                print('{} days, {} passes/day: {} cases'.format(d, p, len(results)), file=sys.stderr)
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        'records': records,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='time and memory of the EPS simulation on synthetic STK scenarios')
+    parser.add_argument('--days', type=float, nargs='+', default=[1, 7, 30])
+    parser.add_argument('--passes', type=float, nargs='+', default=[6])
+    parser.add_argument('--modes', nargs='+', default=['tick', 'event'], choices=['tick', 'event'])
+    parser.add_argument('--skip', type=int, default=3600 * 8)
+    parser.add_argument('--max-tick-days', type=float, default=7)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.days, args.passes, args.modes, args.skip, args.max_tick_days, not args.no_memory, args.seed)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import os
+import numpy as np
+import pandas as pd
+
+from python.parameters import MissionParameters
+
+# synthetic STK exports shaped like the files in data/STK
+penumbra = 8.45
+
+
+def stktime(dt: datetime):
+    return '{} {}.{:03d}'.format(dt.day, dt.strftime('%b %Y %H:%M:%S'), dt.microsecond // 1000)
+
+
+def eclipse(start: datetime,
+            days: float,
+            orbit_period: float = MissionParameters.orbit_period,
+            orbit_eclipse: float = MissionParameters.orbit_eclipse):
+
+    end = start + timedelta(days=days)
+    rows = list()
+    t = start
+    n = 0
+    while t < end:
+        # penumbra, umbra, penumbra once per orbit, clipped to the scenario window
+        total = orbit_eclipse
+        parts = [(penumbra, 'Penumbra'), (total - 2 * penumbra, 'Umbra'), (penumbra, 'Penumbra')]
+        for duration, condition in parts:
+            stop = min(t + timedelta(seconds=duration), end)
+            if stop > t:
+                rows.append((t, stop, condition, n, total))
+            t = stop
+        t += timedelta(seconds=orbit_period - total)
+        n += 1
+
+    return pd.DataFrame({
+        'Start Time (UTCG)': [stktime(r[0]) for r in rows],
+        'Stop Time (UTCG)': [stktime(r[1]) for r in rows],
+        'Duration (sec)': [round((r[1] - r[0]).total_seconds(), 3) for r in rows],
+        'Obstruction': 'Earth',
+        'Start Pass Number': [10000 + r[3] for r in rows],
+        'Stop Pass Number': [10000 + r[3] for r in rows],
+        'Current Condition': [r[2] for r in rows],
+        'Worst Condition': 'Umbra',
+        'Total Duration (sec)': [r[4] for r in rows],
+    })
+
+
+def access(start: datetime,
+           days: float,
+           passes: float,
+           duration: tuple = (60, 680),
+           seed: int = 0):
+
+    # passes per day placed at random, never overlapping
+    rng = np.random.default_rng(seed)
+    total = days * 86400
+    n = int(round(passes * days))
+    durations = rng.uniform(duration[0], duration[1], n)
+    slack = total - durations.sum()
+    if slack <= 0:
+        raise ValueError('too many passes for the scenario length')
+    gaps = np.diff(np.concatenate(([0], np.sort(rng.uniform(0, slack, n)))))
+    starts = np.cumsum(gaps) + np.concatenate(([0], np.cumsum(durations)[:-1]))
+    stops = starts + durations
+
+    return pd.DataFrame({
+        'Access': np.arange(1, n + 1),
+        'Start Time (UTCG)': [stktime(start + timedelta(seconds=float(s))) for s in starts],
+        'Stop Time (UTCG)': [stktime(start + timedelta(seconds=float(s))) for s in stops],
+        'Duration (sec)': np.round(durations, 3),
+    })
+
+
+def generate(folder: str,
+             days: float,
+             passes: float = 6,
+             target_passes: float = 2.5,
+             start: datetime = MissionParameters.dt_mission_start,
+             seed: int = 0):
+
+    # one eclipse, two ground stations and one target export, written as STK csv files
+    files = {
+        'eclipse': eclipse(start, days),
+        'GS_0': access(start, days, passes, seed=seed),
+        'GS_1': access(start, days, passes, seed=seed + 1),
+        'target': access(start, days, target_passes, duration=(120, 550), seed=seed + 2),
+    }
+    paths = dict()
+    os.makedirs(folder, exist_ok=True)
+    for name, data in files.items():
+        paths[name] = os.path.join(folder, name + '.csv')
+        data.to_csv(paths[name], index=False)
+    return paths
+
+
+def load(paths: dict):
+    return {name: pd.read_csv(path) for name, path in paths.items()}
+
+
+@contextmanager
+def mission(days: float, start: datetime = MissionParameters.dt_mission_start):
+    # mission window of a synthetic scenario, timeline cache keys include it
+    saved = (MissionParameters.dt_mission_start, MissionParameters.dt_mission_end)
+    MissionParameters.dt_mission_start = start
+    MissionParameters.dt_mission_end = start + timedelta(days=days)
+    try:
+        yield
+    finally:
+        MissionParameters.dt_mission_start, MissionParameters.dt_mission_end = saved
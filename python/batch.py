@@ -0,0 +1,168 @@
+import numpy as np
+
+from .parameters import *
+from .experiment import Experiment
+from .sweep import default_config
+
+
+class BatchedBatteryPack():
+
+    def __init__(self,
+                 parameters: BatteryCellParameters,
+                 n_series: np.ndarray,
+                 n_parallel: np.ndarray,
+                 starting_SOC: np.ndarray,
+                 EOL: np.ndarray,
+                 ):
+
+        # same charge/discharge rules as BatteryPack, one entry per configuration
+        self.__parameters = parameters
+        self.__voltage = np.asarray(n_series, dtype=float) * parameters.voltage
+        nominal_capacity = np.asarray(n_parallel, dtype=float) * parameters.nominal_capacity
+        self.__capacity = np.where(EOL, parameters.efficiency * nominal_capacity, nominal_capacity)
+        self.__starting_SOC = np.asarray(starting_SOC, dtype=float) * np.ones_like(self.__voltage)
+
+        self.reset()
+
+    @property
+    def voltage(self):
+        return self.__voltage
+
+    @property
+    def soc(self):
+        return self.__SOC
+
+    @property
+    def status(self):
+        return self.__status
+
+    @property
+    def input(self):
+        return self.__input
+
+    @property
+    def output(self):
+        return self.__output
+
+    def reset(self):
+        self.__SOC = self.__starting_SOC.copy()
+        self.__status = np.zeros(len(self.__SOC), dtype=np.uint8)
+        self.__input = np.zeros(len(self.__SOC))
+        self.__output = np.zeros(len(self.__SOC))
+
+    def step(self, power, timestep = 1):
+        # status codes follow Results.statuses['batteries_status']
+        energy = self.__capacity * self.voltage
+        base = self.__parameters.min_charge_rate * energy
+        cstep = self.__parameters.charge_step * energy
+        cap = self.__parameters.max_charge_rate * energy
+
+        charge = power > 0
+        full = charge & (self.__SOC >= 1)
+        rate = np.where(power > cap, cap,
+                        np.where(power > base, base + np.floor((power - base) / cstep) * cstep, 0))
+        rate = np.where(full, 0, rate)
+        self.__SOC = np.where(full, 1, self.__SOC)
+        self.__SOC = self.__SOC + np.where(charge, rate / energy * timestep / 3600, 0)
+        self.__status = np.where(charge, np.where(rate > 0, 1, 0), self.__status)
+        self.__input = np.where(charge, rate, self.__input)
+        self.__output = np.where(charge, 0, self.__output)
+
+        discharge = power < 0
+        dead = discharge & (self.__SOC <= 0)
+        normal = discharge & ~dead & (np.abs(power) < self.__parameters.max_discharge_rate * energy)
+        failure = discharge & ~dead & ~normal
+        self.__input = np.where(discharge, 0, self.__input)
+        self.__SOC = np.where(dead, 0, self.__SOC)
+        self.__output = np.where(dead, 0, np.where(normal, np.abs(power), self.__output))
+        self.__SOC = self.__SOC - np.where(normal, self.__output / energy * timestep / 3600, 0)
+        self.__status = np.where(dead, 3, np.where(normal, 2, np.where(failure, 4, self.__status)))
+
+
+# keys the replay can rescale, anything else shapes the recorded loads and must match the reference run
+batched_keys = ['n_solar_panels', 'solar_n_series', 'solar_n_parallel', 'EOL',
+                'n_battery_packs', 'battery_n_series', 'battery_n_parallel', 'starting_SOC',
+                'solar_efficiency', 'converters_efficiency']
+
+
+def _column(configs, name):
+    return np.asarray([config[name] for config in configs])
+
+
+def simulate(experiment: Experiment,
+             configs: list,
+             keys: list = None,
+             reference: dict = None,
+             record: bool = False):
+    """Replay the loads of days already run by experiment for many EPS configurations.
+
+    Only the keys in batched_keys may vary between configs and reference: solar cell counts,
+    EOL, battery sizing, starting_SOC and efficiencies. Load-shaping keys (n_heaters,
+    heater_eclipse_duration) raise ValueError when they differ from reference, use sweep.run for those.
+    """
+    system = SystemParameters()
+    defaults = dict(default_config,
+                    solar_efficiency=system.solar_efficiency,
+                    converters_efficiency=system.converters_efficiency)
+    reference = dict(defaults, **(reference or {}))
+    configs = [dict(defaults, **config) for config in configs]
+    for config in configs:
+        for name, value in config.items():
+            if name not in batched_keys and value != reference.get(name):
+                raise ValueError('{} changes the loads, it need to match the reference run'.format(name))
+    n = len(configs)
+
+    if keys is None:
+        keys = list(experiment.results.keys())
+    # event-mode rows span several seconds with constant loads, expand them to one row per second
+    # since another configuration's battery can change state inside such a row
+    durations = np.concatenate([experiment.results[key]['duration'].values for key in keys]).astype(np.int64)
+    input_power = np.repeat(np.concatenate([experiment.results[key]['input_power'].values for key in keys]), durations)
+    load_power = np.repeat(np.concatenate([experiment.results[key]['total_load_power'].values for key in keys]), durations)
+
+    cells = _column(configs, 'n_solar_panels') * _column(configs, 'solar_n_series') * _column(configs, 'solar_n_parallel')
+    p = np.where(_column(configs, 'EOL'), SolarCellParameters.p_EOL, SolarCellParameters.p_BOL)
+    solar = cells * p * _column(configs, 'solar_efficiency')
+    reference_p = SolarCellParameters.p_EOL if reference['EOL'] else SolarCellParameters.p_BOL
+    reference_solar = (reference['n_solar_panels'] * reference['solar_n_series'] * reference['solar_n_parallel']
+                       * reference_p * reference['solar_efficiency'])
+    solar_scale = solar / reference_solar
+    load_scale = (2 - _column(configs, 'converters_efficiency')) / (2 - reference['converters_efficiency'])
+
+    n_packs = _column(configs, 'n_battery_packs')
+    pack = BatchedBatteryPack(BatteryCellParameters(),
+                              _column(configs, 'battery_n_series'),
+                              _column(configs, 'battery_n_parallel'),
+                              _column(configs, 'starting_SOC'),
+                              _column(configs, 'EOL').astype(bool))
+
+    # minimum over the recorded rows, like sweep.summary
+    min_soc = np.full(n, np.inf)
+    input_energy = np.zeros(n)
+    output_energy = np.zeros(n)
+    failures = np.zeros(n, dtype=np.int64)
+    history = np.zeros((len(input_power), n)) if record else None
+
+    for t in range(len(input_power)):
+        power = input_power[t] * solar_scale - load_power[t] * load_scale
+        pack.step(power / n_packs)
+        soc = pack.soc
+        np.minimum(min_soc, soc, out=min_soc)
+        input_energy += pack.input * n_packs
+        output_energy += pack.output * n_packs
+        failures += pack.status >= 3
+        if record:
+            history[t] = soc
+
+    summary = list()
+    for i, config in enumerate(configs):
+        summary.append(dict(config,
+                            min_SOC=float(min_soc[i]),
+                            max_DOD=float(1 - min_soc[i]),
+                            final_SOC=float(pack.soc[i]),
+                            battery_input_energy=float(input_energy[i] / 3600),
+                            battery_output_energy=float(output_energy[i] / 3600),
+                            failures=int(failures[i])))
+    if record:
+        return summary, history
+    return summary
@@ -1,10 +1,16 @@
-from datetime import datetime
+from __future__ import annotations
+from typing import TYPE_CHECKING
 
 import math
-import pandas as pd
 import numpy as np
 
 from .parameters import *
+from . import timeline
+from . import stats
+from .utils import csvtoparameters
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 class SolarPanel():
 
@@ -23,11 +29,16 @@ class SolarPanel():
         self.__n_cells = n_series * n_parallel
         self.__current = n_parallel * cell_parameters.current
         # self.__power = self.__voltage * self.__current
+        if face not in ['track', 'x', 'z']:
+            raise ValueError('face need to be track, x or z')
+        if face != 'track' and angle_data is None:
+            raise ValueError('missing angle data')
         self.__face = face
         if EOL:
             self.__p = cell_parameters.p_EOL
         else:
             self.__p = cell_parameters.p_BOL
+        self.__constant = self.__n_cells * self.__p * cell_parameters.cell_area * cell_parameters.phi
 
         self.__initdata(eclipse_data, angle_data)
         self.reset()
@@ -42,16 +53,11 @@ class SolarPanel():
 
     @property
     def power(self):
-        constant = self.__n_cells * self.__p * self.__parameters.cell_area * self.__parameters.phi
         if self.__face != 'track':
-            angle = self.__anglevec[self.time]
-            if self.__face == 'z':
-                return constant * np.sin(angle)
-            if self.__face == 'x':
-                if angle < np.pi/2:
-                    return  constant * np.cos(angle)
-                return constant * np.cos(angle + np.pi)
-        return constant
+            if self.time >= len(self.__projection):
+                return 0
+            return self.__constant * float(self.__projection[self.time])
+        return self.__constant
             
     @property
     def time(self):
@@ -83,7 +89,9 @@ class SolarPanel():
     @property
     def output(self):
         if self.active:
-            return self.timevec[self.time] * self.power
+            if self.__outputvec is not None:
+                return float(self.__outputvec[self.time])
+            return self.timevec[self.time] * self.__constant
         return 0
 
     def reset(self):
@@ -91,29 +99,50 @@ class SolarPanel():
         self.active = True
         self.step()
 
+    @stats.timed('initdata')
     def __initdata(self, eclipse_data, angle_data):
-        missionparameters = MissionParameters()
-        date_format = missionparameters.date_format
-        dt_mission_end = missionparameters.dt_mission_end
-
-        last_dt = missionparameters.dt_mission_start
-        vecs = list()
-        for start_time, stop_time in zip(eclipse_data['Start Time (UTCG)'], eclipse_data['Stop Time (UTCG)']):
-
-            dt_start = datetime.strptime(start_time, date_format)
-            dt_stop = datetime.strptime(stop_time, date_format)
-
-            if last_dt != dt_start:
-                vecs.append(np.ones((dt_start - last_dt).seconds))
-            vecs.append(np.zeros((dt_stop - dt_start).seconds))
+        self.__timevec = timeline.sunlight(eclipse_data)
 
-            last_dt = dt_stop
-        vecs.append(np.zeros((dt_mission_end - last_dt).seconds))
-        self.__timevec = np.hstack(vecs).tolist()
+        # body-mounted faces get their whole output precomputed:
+        # illumination x attitude projection x cell constant
+        self.__projection = None
+        self.__outputvec = None
+        if self.__face != 'track':
+            # the projection is the cached array shared by every panel, only the output is per panel
+            self.__projection = timeline.attitude(angle_data, self.__face)
+            lengths = np.diff(np.append(self.__timevec.edges, len(self.__timevec)))
+            outputvec = np.repeat(self.__timevec.values.astype(np.float32), lengths)
+            n = min(len(outputvec), len(self.__projection))
+            outputvec[:n] *= self.__projection[:n]
+            outputvec[n:] = 0
+            outputvec *= np.float32(self.__constant)
+            self.__outputvec = outputvec
+
+    def profile(self, n: int):
+        # output over the next n calls to step(), without advancing
+        if not self.active:
+            return np.zeros(n)
+        start = self.__time + 1
+        if self.__outputvec is not None:
+            out = np.zeros(n)
+            values = self.__outputvec[start:start + n]
+            out[:len(values)] = values
+            return out
+        return self.__timevec.segment(start, start + n) * self.__constant
+
+    def seek(self, t: int):
+        # jump to absolute mission second t
+        if t < self.datalen:
+            self.__time = t
+            self.active = True
+        else:
+            self.__time = self.datalen - 1
+            self.active = False
 
-        if angle_data is not None:
-            angles = [np.deg2rad(x) for x in angle_data['DirectionAngle x (deg)']]
-            self.__anglevec = angles
+    def advance(self, n: int):
+        # same end state as n calls to step()
+        if self.active:
+            self.seek(self.__time + n)
 
     def step(self, timestep = 1):
         
@@ -231,14 +260,33 @@ class Payload():
 
     @property
     def window(self):
-        return self.timevec[self.time] == 1 and self.__sunvec[self.time] == 1
+        return self.__windowvec[self.time] == 1
 
     @property
     def next_window(self):
-        for i, (v, s) in enumerate(zip(self.timevec[self.time:], self.__sunvec[self.time:])):
-            if v == 1 and s == 1:
-                return i
-        return 0
+        return self.__windowvec.next_on(self.time)
+
+    def seek(self, t: int):
+        # jump to absolute mission second t, status and data are left as they are
+        if t < self.datalen:
+            self.time = t
+            self.active = True
+        else:
+            self.time = self.datalen - 1
+            self.active = False
+
+    def horizon(self):
+        # upcoming one-second steps that leave status and inputs unchanged
+        if not self.active:
+            return math.inf
+        ticks = [self.__windowvec.next_edge(self.time) - 1, self.datalen - 1 - self.time]
+        if self.__elaboration == 'sunlight':
+            ticks.append(self.__sunvec.next_edge(self.time) - 1)
+        if self.status == 'elaboration':
+            ticks.append(math.ceil(self.__raw_data / -self.__parameters.elaboration_datarate[0]) - 1)
+        elif self.status == 'transfer':
+            ticks.append(math.ceil(self.__processed_data / self.__parameters.transfer_datarate) - 1)
+        return max(min(ticks), 0)
 
     def reset(self):
         self.time = -1
@@ -251,40 +299,11 @@ class Payload():
         self.__output_data = 0
         self.step()
 
+    @stats.timed('initdata')
     def __initdata(self, target_data, eclipse_data):
-        missionparameters = MissionParameters()
-        date_format = missionparameters.date_format
-        dt_mission_end = missionparameters.dt_mission_end
-
-        last_dt = missionparameters.dt_mission_start
-        vecs = list()
-        for start_time, stop_time in zip(target_data['Start Time (UTCG)'], target_data['Stop Time (UTCG)']):
-            
-            dt_start = datetime.strptime(start_time, date_format)
-            dt_stop = datetime.strptime(stop_time, date_format)
-
-            if last_dt != dt_start:
-                vecs.append(np.zeros((dt_start - last_dt).seconds))
-            vecs.append(np.ones((dt_stop - dt_start).seconds))
-
-            last_dt = dt_stop
-        vecs.append(np.zeros((dt_mission_end - last_dt).seconds))
-        self.__timevec = np.concatenate(vecs).tolist()
-        
-        last_dt = missionparameters.dt_mission_start
-        vecs = list()
-        for start_time, stop_time in zip(eclipse_data['Start Time (UTCG)'], eclipse_data['Stop Time (UTCG)']):
-
-            dt_start = datetime.strptime(start_time, date_format)
-            dt_stop = datetime.strptime(stop_time, date_format)
-
-            if last_dt != dt_start:
-                vecs.append(np.ones((dt_start - last_dt).seconds))
-            vecs.append(np.zeros((dt_stop - dt_start).seconds))
-
-            last_dt = dt_stop
-        vecs.append(np.zeros((dt_mission_end - last_dt).seconds))
-        self.__sunvec = np.hstack(vecs).tolist()
+        self.__timevec = timeline.access(target_data)
+        self.__sunvec = timeline.sunlight(eclipse_data)
+        self.__windowvec = self.__timevec.combine([self.__sunvec], np.multiply)
 
     def step(self, timestep = 1):
         log = list()
@@ -357,14 +376,15 @@ class TTC():
                  GS_data: list = None,
                  eclipse_data: pd.DataFrame = None,
                  target_data: pd.DataFrame = None,
+                 min_stations: int = 1,
                  ):
         
         if mode not in ['S-band', 'UHF']:
             raise ValueError('mode need to be S-band or UHF')
         else:
-            if sunlight and type(eclipse_data) != pd.core.frame.DataFrame:
+            if sunlight and eclipse_data is None:
                 raise ValueError('missing eclipse data')
-            if target and type(target_data) != pd.core.frame.DataFrame:
+            if target and target_data is None:
                 raise ValueError('missing target data')
             if mode == 'S-band' and GS_data == None:
                 raise ValueError('while using S-band, it is needed to have GS_data')
@@ -380,7 +400,7 @@ class TTC():
             'rx/tx': parameters.average_power_consumption[mode]
         }   
 
-        self.__initdata(GS_data, sunlight, eclipse_data, target, target_data)
+        self.__initdata(GS_data, sunlight, eclipse_data, target, target_data, min_stations)
         self.reset()
 
     @property
@@ -451,32 +471,47 @@ class TTC():
     def timevec(self):
         return self.__timevec
 
+    @property
+    def coverage(self):
+        return self.__coverage
+
+    @property
+    def stations(self):
+        # ground stations in view now, by position in GS_data
+        if self.__coverage is not None:
+            return self.__coverage.stations(self.time)
+        return []
+
     @property
     def datalen(self):
-        return len(self.__timevec)
+        if self.__windowvec is not None:
+            return len(self.__windowvec)
+        return math.inf
 
     @property
     def window(self):
-        # if self.timevec == None and self.__sunvec == None and self.__targetvec == None:
-        #     return True
-        result = True
-        if self.timevec is not None:
-            result = self.timevec[self.time] == 1
-        if self.__sunvec is not None:
-            if result:
-                result = self.__sunvec[self.time] == 1
-        if self.__targetvec is not None:
-            if result:
-                result = self.__targetvec[self.time] == 1
-        return result
+        if self.__windowvec is not None:
+            return self.__windowvec[self.time] == 1
+        return True
 
-    # @property
-    # def next_window(self):
-    #     if self.timevec is not None:
-    #         for i, v in enumerate(self.timevec[self.time:]):
-    #             if v == 1:
-    #                 return i
-    #     return 0
+    @property
+    def next_window(self):
+        if self.__windowvec is not None:
+            return self.__windowvec.next_on(self.time)
+        return 0
+
+    def seek(self, t: int):
+        # jump to absolute mission second t, status and data are left as they are
+        self.time = t
+
+    def horizon(self):
+        # upcoming one-second steps that leave status and inputs unchanged
+        ticks = [math.inf]
+        if self.__windowvec is not None:
+            ticks.append(self.__windowvec.next_edge(self.time) - 1)
+        if self.status == 'tx':
+            ticks.append(math.ceil(self.__data / self.__parameters.datarate) - 1)
+        return max(min(ticks), 0)
 
     def reset(self):
         self.time = -1
@@ -490,80 +525,32 @@ class TTC():
         self.__total_downloaded = 0
         self.step()
 
-    def __initdata(self, GS_data, sunlight, eclipse_data, target, target_data):
-        missionparameters = MissionParameters()
-        date_format = missionparameters.date_format
-        last_dt = missionparameters.dt_mission_start
-        dt_mission_end = missionparameters.dt_mission_end
-
+    @stats.timed('initdata')
+    def __initdata(self, GS_data, sunlight, eclipse_data, target, target_data, min_stations):
+        # min_stations=1 is any station in view, len(GS_data) needs all of them
         if GS_data is not None:
-            timevecs = list()
-            for data in GS_data:
-                last_dt = missionparameters.dt_mission_start
-                vecs = list()
-                for start_time, stop_time in zip(data['Start Time (UTCG)'], data['Stop Time (UTCG)']):
-                    
-                    dt_start = datetime.strptime(start_time, date_format)
-                    dt_stop = datetime.strptime(stop_time, date_format)
-
-                    if last_dt != dt_start:
-                        vecs.append(np.zeros((dt_start - last_dt).seconds))
-                    vecs.append(np.ones((dt_stop - dt_start).seconds))
-
-                    last_dt = dt_stop
-                vecs.append(np.zeros((dt_mission_end - last_dt).seconds))
-                timevecs.append(np.concatenate(vecs))
-
-            max_len = 0
-            for timevec in timevecs:
-                if len(timevec) > max_len:
-                    max_len = len(timevec)
-            for i, timevec in enumerate(timevecs):
-                if len(timevec) < max_len:
-                    timevecs[i] = np.concatenate((timevec, np.zeros((max_len - len(timevec)))))
-
-            timevec = np.sum(timevecs, 0)
-            access = timevec > 0
-            self.__timevec = [1 if t else 0 for t in access]
+            self.__coverage = timeline.coverage(GS_data)
+            self.__timevec = timeline.network(GS_data, min_stations)
         else:
+            self.__coverage = None
             self.__timevec = None
 
         if sunlight:
-            last_dt = missionparameters.dt_mission_start
-            vecs = list()
-            for start_time, stop_time in zip(eclipse_data['Start Time (UTCG)'], eclipse_data['Stop Time (UTCG)']):
-
-                dt_start = datetime.strptime(start_time, date_format)
-                dt_stop = datetime.strptime(stop_time, date_format)
-
-                if last_dt != dt_start:
-                    vecs.append(np.ones((dt_start - last_dt).seconds))
-                vecs.append(np.zeros((dt_stop - dt_start).seconds))
-
-                last_dt = dt_stop
-            vecs.append(np.zeros((dt_mission_end - last_dt).seconds))
-            self.__sunvec = np.hstack(vecs).tolist()
+            self.__sunvec = timeline.sunlight(eclipse_data)
         else:
             self.__sunvec = None
 
         if target:
-            last_dt = missionparameters.dt_mission_start
-            vecs = list()
-            for start_time, stop_time in zip(target_data['Start Time (UTCG)'], target_data['Stop Time (UTCG)']):
-                
-                dt_start = datetime.strptime(start_time, date_format)
-                dt_stop = datetime.strptime(stop_time, date_format)
-
-                if last_dt != dt_start:
-                    vecs.append(np.zeros((dt_start - last_dt).seconds))
-                vecs.append(np.ones((dt_stop - dt_start).seconds))
-
-                last_dt = dt_stop
-            vecs.append(np.zeros((dt_mission_end - last_dt).seconds))
-            self.__targetvec = np.concatenate(vecs).tolist()
+            self.__targetvec = timeline.access(target_data)
         else:
             self.__targetvec = None
-    
+
+        vecs = [vec for vec in (self.__timevec, self.__sunvec, self.__targetvec) if vec is not None]
+        if vecs:
+            self.__windowvec = vecs[0].combine(vecs[1:], lambda *x: np.prod(x, 0))
+        else:
+            self.__windowvec = None
+
     def step(self, timestep = 1):
         
         log = list()
@@ -652,6 +639,15 @@ class BatteryPack():
         if self.active:
             return self.__output
 
+    def horizon(self):
+        # upcoming steps at the same power before the SOC reaches a limit
+        energy = self.__capacity * self.voltage * 3600
+        if self.status == 'charging' and self.__input > 0:
+            return max(math.ceil((1 - self.__SOC) * energy / self.__input), 0)
+        if self.status == 'discharging' and self.__output > 0:
+            return max(math.ceil(self.__SOC * energy / self.__output), 0)
+        return math.inf
+
     def reset(self):
         self.__status = 'idle'
         self.active = True
@@ -709,7 +705,7 @@ class Component():
                  eclipse_data: pd.DataFrame = None,
                  ):
         
-        if parameters.sunlight and type(eclipse_data) != pd.core.frame.DataFrame:
+        if parameters.sunlight and eclipse_data is None:
             raise ValueError('missing eclipse data')
 
         self.__parameters = parameters
@@ -762,26 +758,31 @@ class Component():
         self.active = True
         self.step()
 
+    @stats.timed('initdata')
     def __initdata(self, eclipse_data):
-        missionparameters = MissionParameters()
-        date_format = missionparameters.date_format
-        last_dt = missionparameters.dt_mission_start
-        dt_mission_end = missionparameters.dt_mission_end
-
-        last_dt = missionparameters.dt_mission_start
-        vecs = list()
-        for start_time, stop_time in zip(eclipse_data['Start Time (UTCG)'], eclipse_data['Stop Time (UTCG)']):
-
-            dt_start = datetime.strptime(start_time, date_format)
-            dt_stop = datetime.strptime(stop_time, date_format)
-
-            if last_dt != dt_start:
-                vecs.append(np.ones((dt_start - last_dt).seconds))
-            vecs.append(np.zeros((dt_stop - dt_start).seconds))
+        self.__sunvec = timeline.sunlight(eclipse_data)
+
+    def profile(self, n: int):
+        # input over the next n calls to step(), without advancing
+        if not self.active:
+            return np.zeros(n)
+        if self.__sunvec is None:
+            return np.full(n, float(self.__power))
+        return self.__power * self.__sunvec.segment(self.time + 1, self.time + 1 + n)
+
+    def seek(self, t: int):
+        # jump to absolute mission second t
+        if self.__sunvec is None or t < len(self.__sunvec):
+            self.time = t
+            self.active = True
+        else:
+            self.time = len(self.__sunvec) - 1
+            self.active = False
 
-            last_dt = dt_stop
-        vecs.append(np.zeros((dt_mission_end - last_dt).seconds))
-        self.__sunvec = np.hstack(vecs).tolist()
+    def advance(self, n: int):
+        # same end state as n calls to step()
+        if self.active:
+            self.seek(self.time + n)
 
     def step(self, timestep = 1):
         
@@ -798,6 +799,137 @@ class Component():
         return log
 
 
+class Rail():
+
+    def __init__(self,
+                 voltage,
+                 power: float,
+                 sunlight_power: float = 0,
+                 sunvec: timeline.Timeline = None,
+                 length: int = 0,
+                 ):
+
+        # summed load of every component on one voltage rail, sunlight_power
+        # only draws while sunvec is 1 and stops past the end of the data
+        self.__voltage = voltage
+        self.__power = power
+        if sunlight_power and sunvec is not None:
+            lengths = np.diff(np.append(sunvec.edges, len(sunvec)))
+            self.__loadvec = timeline.Timeline.from_runs(power + sunlight_power * sunvec.values, lengths)
+        else:
+            self.__loadvec = timeline.Timeline([0], [power], length)
+        self.reset()
+
+    @property
+    def voltage(self):
+        return self.__voltage
+
+    @property
+    def time(self):
+        return self.__time
+
+    @time.setter
+    def time(self, value):
+        self.__time = value
+
+    @property
+    def loadvec(self):
+        return self.__loadvec
+
+    @property
+    def input(self):
+        if self.time < len(self.__loadvec):
+            return self.__loadvec[self.time]
+        return self.__power
+
+    def reset(self):
+        self.time = -1
+        self.step()
+
+    def profile(self, n: int):
+        # input over the next n calls to step(), without advancing
+        return self.__loadvec.segment(self.time + 1, self.time + 1 + n, fill=self.__power)
+
+    def seek(self, t: int):
+        self.time = t
+
+    def advance(self, n: int):
+        self.seek(self.time + n)
+
+    def step(self, timestep = 1):
+        self.time = self.time + timestep
+        return list()
+
+
+class ComponentBank():
+
+    def __init__(self,
+                 parameters: list,
+                 eclipse_data: pd.DataFrame = None,
+                 ):
+
+        # housekeeping loads grouped by rail and sunlight gating, so stepping them
+        # costs one Rail per voltage however many components there are
+        if any(p.sunlight for p in parameters) and eclipse_data is None:
+            raise ValueError('missing eclipse data')
+
+        self.__parameters = list(parameters)
+        self.__initdata(eclipse_data)
+
+        powers = dict()
+        for p in self.__parameters:
+            power = powers.setdefault(p.voltage, [0., 0.])
+            power[1 if p.sunlight else 0] += p.power
+        if self.__sunvec is not None:
+            length = len(self.__sunvec)
+        else:
+            missionparameters = MissionParameters()
+            length = int((missionparameters.dt_mission_end - missionparameters.dt_mission_start).total_seconds())
+        self.__rails = [Rail(voltage, power, sunlight_power, self.__sunvec, length)
+                        for voltage, (power, sunlight_power) in powers.items()]
+
+    @classmethod
+    def from_csv(cls, file_path: str, eclipse_data: pd.DataFrame = None):
+        return cls(csvtoparameters(file_path), eclipse_data)
+
+    @property
+    def parameters(self):
+        return self.__parameters
+
+    @property
+    def rails(self):
+        # Component-like loads to pass to Experiment as its components
+        return self.__rails
+
+    @property
+    def voltages(self):
+        return [rail.voltage for rail in self.__rails]
+
+    def load(self, voltage):
+        # whole-mission load of one rail as a Timeline
+        for rail in self.__rails:
+            if rail.voltage == voltage:
+                return rail.loadvec
+        raise KeyError(voltage)
+
+    def breakdown(self, t: int):
+        # power drawn by each component at mission second t
+        sun = 1.
+        if self.__sunvec is not None:
+            sun = self.__sunvec[t] if t < len(self.__sunvec) else 0.
+        return [{'name': p.name,
+                 'voltage': p.voltage,
+                 'power': p.power * sun if p.sunlight else p.power}
+                for p in self.__parameters]
+
+    @stats.timed('initdata')
+    def __initdata(self, eclipse_data):
+        if eclipse_data is not None:
+            self.__sunvec = timeline.sunlight(eclipse_data)
+        else:
+            self.__sunvec = None
+
+
 class Heater():
 
     def __init__(self,
@@ -805,7 +937,7 @@ class Heater():
                  eclipse_data: pd.DataFrame = None,
                  ):
         
-        if type(eclipse_data) != pd.core.frame.DataFrame:
+        if eclipse_data is None:
             raise ValueError('missing eclipse data')
 
         self.__parameters = parameters
@@ -855,44 +987,33 @@ class Heater():
         self.active = True
         self.step()
 
+    @stats.timed('initdata')
     def __initdata(self, eclipse_data):
-        missionparameters = MissionParameters()
-        date_format = missionparameters.date_format
-        dt_mission_end = missionparameters.dt_mission_end
-
-        last_dt = missionparameters.dt_mission_start
-        vecs = list()
-        for start_time, stop_time in zip(eclipse_data['Start Time (UTCG)'], eclipse_data['Stop Time (UTCG)']):
-
-            dt_start = datetime.strptime(start_time, date_format)
-            dt_stop = datetime.strptime(stop_time, date_format)
-
-            if last_dt != dt_start:
-                sun = (dt_start - last_dt).seconds
-                if self.__parameters.sun_duration > 0:
-                    act = math.floor(sun * self.__parameters.sun_duration)
-                    vecs.append(np.ones(act))
-                    vecs.append(np.zeros(sun - act))
-                else:
-                    vecs.append(np.zeros(sun))
-            eclipse = (dt_stop - dt_start).seconds
-            if self.__parameters.eclipse_duration > 0:
-                if eclipse > 10:
-                    act = math.floor(eclipse * self.__parameters.eclipse_duration)
-                    vecs.append(np.zeros(eclipse - act))
-                    vecs.append(np.ones(act))
-                else:
-                    if vecs[-1][-1] == 1:
-                        vecs.append(np.ones(eclipse))
-                    else:
-                        vecs.append(np.zeros(eclipse))
-            else:
-                vecs.append(np.zeros(eclipse))
-
-            last_dt = dt_stop
-        vecs.append(np.zeros((dt_mission_end - last_dt).seconds))
+        self.__heatvec = timeline.heating(eclipse_data,
+                                          self.__parameters.eclipse_duration,
+                                          self.__parameters.sun_duration)
+
+    def profile(self, n: int):
+        # input over the next n calls to step(), without advancing
+        if not self.active:
+            return np.zeros(n)
+        if self.__heatvec is None:
+            return np.full(n, float(self.__power))
+        return self.__power * self.__heatvec.segment(self.time + 1, self.time + 1 + n)
+
+    def seek(self, t: int):
+        # jump to absolute mission second t
+        if self.__heatvec is None or t < len(self.__heatvec):
+            self.time = t
+            self.active = True
+        else:
+            self.time = len(self.__heatvec) - 1
+            self.active = False
 
-        self.__heatvec = np.hstack(vecs).tolist()
+    def advance(self, n: int):
+        # same end state as n calls to step()
+        if self.active:
+            self.seek(self.time + n)
 
     def step(self, timestep = 1):
         
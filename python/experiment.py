@@ -1,9 +1,13 @@
 import os 
-import matplotlib.pyplot as plt
-plt.rcParams.update({'font.size': 30})
+import copy
+from bisect import bisect_right
+from datetime import datetime
 
 from .components import *
 from .parameters import SystemParameters
+from .results import Results
+from .timeline import OrbitIndex
+from . import stats
 
 
 class Experiment():
@@ -31,6 +35,19 @@ class Experiment():
 
         self.output_folder = output_folder
         self.f = None
+        # plotted points per horizontal pixel, None plots every sample
+        self.fidelity = 1
+
+        self.__mode = 'tick'
+        self.__last = None
+        self.__orbits = None
+        # day opened by start_day() and not yet closed by end_day()
+        self.__day = None
+
+        # phase timers and step counters, None unless profiling is enabled
+        self.stats = stats.active()
+        if self.stats is not None:
+            self.profile()
 
     def reset(self):
         comps = list()
@@ -38,199 +55,366 @@ class Experiment():
         for comp in comps:
             comp.reset()
 
-    def skiptime(self, value=1):
+    @property
+    def time(self):
+        return self.payload.time
+
+    def profile(self, enabled: bool = True):
+        comps = list()
+        comps += self.solar_panels + self.components + self.ttcs + self.heaters + self.battery_packs + [self.payload]
+        if enabled:
+            if self.stats is None:
+                self.stats = stats.Stats()
+            for comp in comps:
+                self.stats.instrument(comp)
+            return self.stats
+
+        collected = self.stats
+        if collected is not None:
+            for comp in comps:
+                collected.uninstrument(comp)
+        self.stats = None
+        return collected
+
+    def snapshot(self):
+        # timelines are immutable, so a shallow copy of each component is a full checkpoint
+        comps = list()
+        comps += self.solar_panels + self.components + self.ttcs + self.heaters + self.battery_packs + [self.payload]
+        state = {
+            'components': [dict(vars(comp)) for comp in comps],
+            'key': self.key,
+            'results': dict(self.results),
+            'mode': self.__mode,
+            'last': self.__last,
+            'day': None,
+        }
+        if self.__day is not None:
+            # a day in progress keeps appending to its results, so the snapshot keeps its own
+            state['results'][self.key] = self.results[self.key].copy()
+            state['day'] = dict(self.__day)
+        return state
+
+    def restore(self, state: dict):
+        comps = list()
+        comps += self.solar_panels + self.components + self.ttcs + self.heaters + self.battery_packs + [self.payload]
+        for comp, saved in zip(comps, state['components']):
+            vars(comp).clear()
+            vars(comp).update(saved)
+        self.key = state['key']
+        self.results = dict(state['results'])
+        # states saved without an open day restore to a closed one
+        self.__mode = state.get('mode', 'tick')
+        self.__last = state.get('last')
+        self.__day = None
+        if state.get('day') is not None:
+            # copy again so the same snapshot can be restored more than once
+            self.results[self.key] = state['results'][self.key].copy()
+            self.__day = dict(state['day'])
+
+    def fork(self):
+        # completed days are shared, day() always writes a fresh Results for its key
+        experiment = copy.copy(self)
+        experiment.payload = copy.copy(self.payload)
+        experiment.solar_panels = [copy.copy(x) for x in self.solar_panels]
+        experiment.battery_packs = [copy.copy(x) for x in self.battery_packs]
+        experiment.ttcs = [copy.copy(x) for x in self.ttcs]
+        experiment.components = [copy.copy(x) for x in self.components]
+        experiment.heaters = [copy.copy(x) for x in self.heaters]
+        experiment.results = dict(self.results)
+        if self.__day is not None:
+            # a day in progress keeps appending to its results, so each fork gets its own
+            experiment.results[self.key] = self.results[self.key].copy()
+            experiment.__day = dict(self.__day)
+        return experiment
+
+    def seek(self, t: int):
         comps = list()
         comps += self.solar_panels + self.components + self.ttcs + self.heaters + [self.payload]
         for comp in comps:
-            comp.step(value)
-        sun_check = sum([x.output for x in self.solar_panels])
-        skip = True
-        while skip:
-            for comp in comps:
-                comp.step()
-            sun = sum([x.output for x in self.solar_panels])
-            if sun_check > 0:
-                if sun == 0:
-                    skip = False
-            else:
-                if sun > 0:
-                    skip = False
+            comp.seek(t)
+
+    def seek_to_datetime(self, dt: datetime):
+        self.seek(int((dt - self.missionparameters.dt_mission_start).total_seconds()))
+
+    def seek_to_edge(self):
+        # jump to the next sunlight/eclipse transition seen by the solar panels
+        timevecs = [x.timevec for x in self.solar_panels]
+        sunvec = timevecs[0].combine(timevecs[1:], lambda *x: np.max(x, 0))
+        self.seek(self.time + sunvec.next_edge(self.time))
+
+    @stats.timed('skiptime')
+    def skiptime(self, value=1):
+        self.seek(self.time + value)
+        self.seek_to_edge()
 
+    @stats.timed('day')
     def day(self,
             key: str,
             schedule: list,
-            absolute_time: int = 0):
+            absolute_time: int = 0,
+            mode: str = 'tick',
+            resample: bool = True):
+        self.start_day(key, mode)
+        for task in schedule:
+            self.run_task(task)
+        return self.end_day(absolute_time, resample)
+
+    def start_day(self, key: str, mode: str = 'tick'):
+        # day() split in three, so a day can be forked between tasks
+        if mode not in ['tick', 'event']:
+            raise ValueError('mode need to be tick or event')
         self.key = key
-        self.results[self.key] = {
-            'input_power': [],
-            'total_load_power': [],
-            'load_power': [],
-            'load_current': [],
-            'heaters_power': [],
-            'ttc_power': [],
-            'batteries': [],
-            'diss_power': [],
-            'payload_status': [],
-            'batteries_status': [],
-            'S-band_status': [],
-            'UHF_status': [],
-            'heaters_status': [],
-            'solar_energy': [],
-            'load_energy': [],
-            'battery_input_energy': [],
-            'battery_output_energy': [],
-        }
+        self.__mode = mode
+        self.__last = None
+        max_time = self.missionparameters.n_orbit * self.missionparameters.orbit_period
 
+        self.results[self.key] = Results(max_time, self.time + 1)
+        self.__day = {'static': self.__static(max_time), 'time': 0, 'max_time': max_time}
+
+    def run_task(self, task: str):
+        day = self.__day
+        day['time'] = self.__task(task, day['static'], day['time'], day['max_time'])
+
+    def end_day(self, absolute_time: int = 0, resample: bool = True):
+        day = self.__day
+        time = self.__finish(day['static'], day['time'], day['max_time'])
+        self.__day = None
+        self.__energy(resample, self.missionparameters.n_orbit)
+        if self.stats is not None:
+            self.stats.simulated += time
+
+        return time + absolute_time
+
+    @stats.timed('mission')
+    def mission(self,
+                key: str,
+                schedules: dict = None,
+                mode: str = 'event',
+                resample: bool = False):
+        # run from the current time to the end of the mission data in one results buffer,
+        # schedules maps a day number (1, 2, ... or 'day_1', ...) to that day's tasks;
+        # event rows keep their durations unless resample=True expands them to one per second
+        if mode not in ['tick', 'event']:
+            raise ValueError('mode need to be tick or event')
+        if schedules is None:
+            schedules = dict()
+        self.key = key
+        self.__mode = mode
+        self.__last = None
         orbit_period = self.missionparameters.orbit_period
-        n_orbit = self.missionparameters.n_orbit
-        max_time = n_orbit * orbit_period
+        day_time = self.missionparameters.n_orbit * orbit_period
+        end = min([self.payload.datalen] + [ttc.datalen for ttc in self.ttcs])
+        max_time = end - 1 - self.time
 
+        self.results[self.key] = Results(max_time, self.time + 1)
         time = 0
-        for task in schedule:
-            if task == 'acquisition':
-                self.payload.next_status = 'acquisition'
-                while self.payload.status != 'elaboration' and time < max_time:
-                    time += 1
-                    self.step()
-                while self.payload.raw_data > 0 and time < max_time:
-                    time += 1
-                    self.step()
-            elif task == 'transfer':
-                self.payload.next_status = 'transfer'
-                while self.payload.processed_data > 0 and time < max_time:
-                    time += 1
-                    self.step()
-            elif task == 'download':
-                ttc_idx = 0
-                for i, ttc in enumerate(self.ttcs):
-                    if ttc.mode == 'S-band':
-                        ttc.next_status = 'tx'
-                        ttc_idx = i
-                while self.ttcs[ttc_idx].data > 0 and time < max_time:
-                    time += 1
-                    self.step()
-
+        day = 1
         while time < max_time:
-            time += 1
-            self.step()
+            schedule = schedules.get(day, schedules.get('day_{}'.format(day), []))
+            time += self.__run(schedule, min(day_time, max_time - time))
+            day += 1
+        self.__energy(resample, math.ceil(max_time / orbit_period))
+        if self.stats is not None:
+            self.stats.simulated += time
 
-        t = 0
-        for _ in range(n_orbit):
-            self.results[self.key]['solar_energy'].append(sum([x for x in self.results[self.key]['input_power'][t:t+orbit_period]])/3600)
-            self.results[self.key]['load_energy'].append(sum([x for x in self.results[self.key]['total_load_power'][t:t+orbit_period]])/3600)
-            self.results[self.key]['battery_input_energy'].append(sum([x['input_power'] for x in self.results[self.key]['batteries'][t:t+orbit_period]])/3600)
-            self.results[self.key]['battery_output_energy'].append(sum([x['output_power'] for x in self.results[self.key]['batteries'][t:t+orbit_period]])/3600)
-            t += orbit_period
+        return time
 
-        return time + absolute_time
+    def day_view(self, day: int, key: str = None):
+        # day is counted from 0 within a mission() or day() run
+        n_orbit = self.missionparameters.n_orbit
+        day_time = n_orbit * self.missionparameters.orbit_period
+        results = self.results[key or self.key]
+        view = results.view(day * day_time, (day + 1) * day_time)
+        for name in ['solar_energy', 'load_energy', 'battery_input_energy', 'battery_output_energy']:
+            view[name] = results[name][day * n_orbit:(day + 1) * n_orbit]
+        return view
+
+    def orbit_view(self, orbit: int, key: str = None):
+        orbit_period = self.missionparameters.orbit_period
+        results = self.results[key or self.key]
+        view = results.view(orbit * orbit_period, (orbit + 1) * orbit_period)
+        for name in ['solar_energy', 'load_energy', 'battery_input_energy', 'battery_output_energy']:
+            view[name] = results[name][orbit:orbit + 1]
+        return view
 
-    def energyplot(self):
-        fontsize = 30
-        timeline = [t for t in range(self.missionparameters.n_orbit)]
+    def __run(self, schedule, max_time):
+        static = self.__static(max_time)
 
-        fig, axarr = plt.subplots(1, 1, figsize=(20, 10), squeeze=False)
-        
-        axarr[0,0].plot(timeline, self.results[self.key]['solar_energy'], label='Solar')
-        axarr[0,0].plot(timeline, self.results[self.key]['load_energy'], label='Loads')
-        # axarr[0,0].plot(timeline, self.results[self.key]['battery_input_energy'], label='Battery input')
-        # axarr[0,0].plot(timeline, self.results[self.key]['battery_output_energy'], label='Battery output')
-
-        axarr[0,0].set_ylabel('Energy (Wh)', fontsize=fontsize)
-        axarr[0,0].set_xlabel('Orbit n.', fontsize=fontsize)
-        axarr[0,0].set_xlim((0, self.missionparameters.n_orbit-1))
-        axarr[0,0].set_ylim((0, 40))
-        axarr[0,0].legend(loc='lower right', fontsize=fontsize)
-
-        fig.show()
-        plt.savefig(os.path.join(self.output_folder, self.key + '_energy' + '.jpg'), 
-                    bbox_inches = 'tight',
-                    pad_inches = 0.1)
-
-    def __plot(self,
-               loc: tuple,
-               timeline: list,
-               name: list,
-               legend: bool = False
-               ):
-
-        fontsize = 30
-        l_name = []
-        if type(name) == str:
-            # self.axarr[loc[0],loc[1]].set_title(name)
-            l_name.append(name)
-            # self.axarr[loc[0],loc[1]].set_xlabel('Time (h)', fontsize=fontsize)
-            self.axarr[loc[0],loc[1]].set_ylabel('Power (W)', fontsize=fontsize)
-            self.axarr[loc[0],loc[1]].set_ylim((0, 40))
-            self.axarr[loc[0],loc[1]].plot(timeline, self.results[self.key][name])
-        elif type(name) == list and len(name) == 2:
-            c = name[0]
-            n = name[1]
-            l_name.append('_'.join([name[0], str(name[1])]))
-            # self.axarr[loc[0],loc[1]].set_title(c + ' ' + str(n))
-            # self.axarr[loc[0],loc[1]].set_xlabel('Time (h)', fontsize=fontsize)
-            if 'power' in c:
-                self.axarr[loc[0],loc[1]].set_ylabel('Power (W)', fontsize=fontsize)
-                self.axarr[loc[0],loc[1]].set_ylim((0, 40))
-            elif 'current' in c:
-                self.axarr[loc[0],loc[1]].set_ylabel('Current (A)', fontsize=fontsize)
-                self.axarr[loc[0],loc[1]].set_ylim((0, 2))
-            elif c == 'batteries':
-                if 'power' in n:
-                    self.axarr[loc[0],loc[1]].set_ylabel('Power (W)', fontsize=fontsize)
-                    self.axarr[loc[0],loc[1]].set_ylim((0, 40))
-                elif n=='DOD':
-                    self.axarr[loc[0],loc[1]].set_ylim((0.10, 0))
-                elif n=='SOC':
-                    self.axarr[loc[0],loc[1]].set_ylim((0.9, 1))
-            self.axarr[loc[0],loc[1]].plot(timeline, [x[n] for x in self.results[self.key][c]])
-        
-        self.axarr[loc[0],loc[1]].set_xlabel('Time (h)', fontsize=fontsize)
-        self.axarr[loc[0],loc[1]].set_xlim((0, self.missionparameters.orbit_period*15/3600))
-        # self.axarr[loc[0],loc[1]].get_xticklabels().set_fontsize(fontsize)
+        time = 0
+        for task in schedule:
+            time = self.__task(task, static, time, max_time)
+        return self.__finish(static, time, max_time)
+
+    def __task(self, task, static, time, max_time):
+        if task == 'acquisition':
+            self.payload.next_status = 'acquisition'
+            while self.payload.status != 'elaboration' and time < max_time:
+                time += self.__advance(static, time, max_time)
+            while self.payload.raw_data > 0 and time < max_time:
+                time += self.__advance(static, time, max_time)
+        elif task == 'transfer':
+            self.payload.next_status = 'transfer'
+            while self.payload.processed_data > 0 and time < max_time:
+                time += self.__advance(static, time, max_time)
+        elif task == 'download':
+            ttc_idx = 0
+            for i, ttc in enumerate(self.ttcs):
+                if ttc.mode == 'S-band':
+                    ttc.next_status = 'tx'
+                    ttc_idx = i
+            while self.ttcs[ttc_idx].data > 0 and time < max_time:
+                time += self.__advance(static, time, max_time)
+        return time
+
+    def __finish(self, static, time, max_time):
+        while time < max_time:
+            time += self.__advance(static, time, max_time)
 
-        return l_name
+        for comp in self.solar_panels + self.components + self.heaters:
+            comp.advance(max_time)
 
+        return time
+
+    @stats.timed('energy')
+    def __energy(self, resample, n_orbit):
+        orbit_period = self.missionparameters.orbit_period
+        results = self.results[self.key]
+        if self.__mode == 'event' and resample:
+            results = results.resample()
+            self.results[self.key] = results
+
+        starts = np.arange(n_orbit) * orbit_period
+        stops = starts + orbit_period
+        results['solar_energy'] += results.energy('input_power', starts, stops).tolist()
+        results['load_energy'] += results.energy('total_load_power', starts, stops).tolist()
+        results['battery_input_energy'] += results.energy(['batteries', 'input_power'], starts, stops).tolist()
+        results['battery_output_energy'] += results.energy(['batteries', 'output_power'], starts, stops).tolist()
+
+    @property
+    def orbits(self):
+        if self.__orbits is None:
+            # built from the sunlight timeline the panels share, forks taken afterwards reuse it
+            self.__orbits = OrbitIndex(self.solar_panels[0].timevec)
+        return self.__orbits
+
+    def orbit_energy(self, name, key: str = None):
+        # energy per eclipse-aligned orbit overlapping the results of key
+        results = self.results[key or self.key]
+        windows = self.orbits.windows(results.start, results.start + int(results['duration'].values.sum()))
+        return self.energy(name, windows, key)
+
+    def energy(self, name, windows, key: str = None):
+        # energy in Wh of a power column over absolute mission-second windows,
+        # e.g. Timeline.runs() of an access or eclipse timeline
+        results = self.results[key or self.key]
+        windows = np.asarray(windows).reshape(-1, 2) - results.start
+        return results.energy(name, windows[:, 0], windows[:, 1])
+
+    @stats.timed('plot')
+    def energyplot(self, orbits: str = 'nominal', close: bool = None):
+        # orbits='eclipse' splits the run at eclipse entries instead of every orbit_period,
+        # close=True releases the figure once saved, the default on a non-interactive backend
+        from . import plotting
+        plt = plotting.pyplot()
+        if close is None:
+            close = plotting.headless()
+        solar_energy, load_energy = self.__energies(orbits)
+
+        with plotting.style():
+            fig, axarr = plt.subplots(1, 1, figsize=(20, 10), squeeze=False)
+            plotting.draw_energy(axarr[0,0], solar_energy, load_energy, self.fidelity)
+
+            fig.show()
+            plt.savefig(os.path.join(self.output_folder, self.key + '_energy' + '.jpg'), 
+                        bbox_inches = 'tight',
+                        pad_inches = 0.1)
+            if close:
+                plt.close(fig)
+
+    def __energies(self, orbits, key: str = None):
+        if orbits == 'eclipse':
+            return self.orbit_energy('input_power', key), self.orbit_energy('total_load_power', key)
+        results = self.results[key or self.key]
+        return list(results['solar_energy']), list(results['load_energy'])
+
+    def __values(self, name, key: str = None):
+        return self.results[key or self.key].column(name).values
+
+    @stats.timed('plot')
     def plot(self,
              names: list,
              legend: bool = False,
              max_col: int = 3,
+             close: bool = None,
              ):
 
-        timeline = [t/3600 for t in range(len(self.results[self.key]['input_power']))]
-
-        # max_col = 3
-        l = len(names)
-        rc = math.ceil(l/max_col)
-        n_x = rc
-        n_y = l - max_col * (n_x - 1)
-        figsize = (n_y*20, 10*n_x)
-        self.fig, self.axarr = plt.subplots(n_x, n_y, figsize=figsize, squeeze=False)
-
-        l_name = [self.key]
-        r = 0
-        c = 0
-        for name in names:
-            l_name += self.__plot((r, c), timeline, name, legend)
-
-            c += 1
-            if c >= max_col:
-                r += 1
-                c = 0
-
-        f_name = '-'.join(l_name)
-        self.fig.show()
-        plt.savefig(os.path.join(self.output_folder, f_name + '.jpg'), 
-                    bbox_inches = 'tight',
-                    pad_inches = 0.1)
-
+        # close=True releases the figure once saved, the default on a non-interactive backend
+        from . import plotting
+        plt = plotting.pyplot()
+        if close is None:
+            close = plotting.headless()
+        timeline = self.results[self.key].edges()/3600
+        xmax = self.missionparameters.orbit_period*15/3600
+
+        with plotting.style():
+            n_x, n_y, figsize = plotting.layout(len(names), max_col)
+            self.fig, self.axarr = plt.subplots(n_x, n_y, figsize=figsize, squeeze=False)
+
+            l_name = [self.key]
+            for i, name in enumerate(names):
+                ax = self.axarr[i // max_col, i % max_col]
+                l_name.append(plotting.draw(ax, timeline, name, self.__values(name), xmax, self.fidelity))
+
+            f_name = '-'.join(l_name)
+            self.fig.show()
+            plt.savefig(os.path.join(self.output_folder, f_name + '.jpg'), 
+                        bbox_inches = 'tight',
+                        pad_inches = 0.1)
+            if close:
+                plt.close(self.fig)
+
+    @stats.timed('plot')
+    def render(self,
+               names: list = None,
+               keys: list = None,
+               energy: bool = True,
+               thermal: bool = False,
+               orbits: str = 'nominal',
+               max_col: int = 3,
+               processes: int = None):
+        # headless batch rendering of every run in keys, one Agg figure per job in a process pool
+        from . import plotting
+        keys = list(self.results.keys()) if keys is None else keys
+        xmax = self.missionparameters.orbit_period*15/3600
+
+        jobs = list()
+        for key in keys:
+            if names:
+                values = [self.__values(name, key) for name in names]
+                jobs.append({'kind': 'plot', 'key': key, 'names': names, 'values': values,
+                             'timeline': self.results[key].edges()/3600, 'xmax': xmax,
+                             'max_col': max_col, 'fidelity': self.fidelity, 'output_folder': self.output_folder})
+            if energy:
+                solar_energy, load_energy = self.__energies(orbits, key)
+                jobs.append({'kind': 'energy', 'key': key, 'solar_energy': solar_energy, 'load_energy': load_energy,
+                             'fidelity': self.fidelity, 'output_folder': self.output_folder})
+            if thermal:
+                jobs.append({'kind': 'thermal', 'key': key, 'timeline': self.results[key].edges(),
+                             'diss_power': self.__values('diss_power', key),
+                             'fidelity': self.fidelity, 'output_folder': self.output_folder})
+
+        return plotting.render_all(jobs, processes)
+
+    @stats.timed('csv')
     def csv(self,
             names):
         
-        timeline = [t for t in range(len(self.results[self.key]['input_power']))]
+        seconds = self.results[self.key].times().tolist()
+        durations = self.results[self.key]['duration']
         if self.output_folder is not None:
             with open(os.path.join(self.output_folder, self.key + '.csv'), 'w') as f:
 
-                f.write('time (s),')
+                f.write('time (s),duration (s),')
                 for name in names:
                     if type(name) == str:
                         if 'power' in name:
@@ -257,9 +441,10 @@ class Experiment():
                     f.write(s)
                 f.write('\n')
 
-                for t in timeline:
+                for t, second in enumerate(seconds):
                     values = list()
-                    values.append(str(t))
+                    values.append(str(second))
+                    values.append(str(int(durations[t])))
 
                     for name in names:
                         if type(name) == str:
@@ -269,121 +454,191 @@ class Experiment():
                     line = ','.join(values)
                     f.write(line + '\n')    
 
+    @stats.timed('csv')
     def csv_thermal(self):
-        timeline = [t for t in range(len(self.results[self.key]['diss_power']))]
+        timeline = self.results[self.key].times().tolist()
+        durations = [int(d) for d in self.results[self.key]['duration']]
         if self.output_folder is not None:
             with open(os.path.join(self.output_folder, self.key + '.csv'), 'w') as f:
-                f.write('time (s),dissipated power (W),solar power (W),payload status,batteries status,s-band status,heaters status\n')
-                for t, v, s, p, b, sb, h in zip(timeline, 
+                f.write('time (s),duration (s),dissipated power (W),solar power (W),payload status,batteries status,s-band status,heaters status\n')
+                for t, d, v, s, p, b, sb, h in zip(timeline,
+                                                durations,
                                                 self.results[self.key]['diss_power'],
                                                 self.results[self.key]['input_power'],
                                                 self.results[self.key]['payload_status'],
                                                 self.results[self.key]['batteries_status'],
                                                 self.results[self.key]['S-band_status'],
                                                 self.results[self.key]['heaters_status']):                           
-                    values = [str(t), str(v), str(s), p, b, sb, h]
+                    values = [str(t), str(d), str(v), str(s), p, b, sb, h]
                     line = ','.join(values)
                     f.write(line + '\n')
 
-    def plot_thermal(self):
-        timeline = [t for t in range(len(self.results[self.key]['diss_power']))]
-        plt.figure(figsize=(30, 10))
-        # plt.plot(timeline, self.results[self.key]['input_power'], label = 'solar_power')
-        # plt.plot(timeline, self.results[self.key]['heaters_power'], label = 'heaters_power')
-        # plt.plot(timeline, [sum(x.values()) for x in self.results[self.key]['load_power']], label = 'loads_power')
-        # plt.plot(timeline, [x['input_power'] for x in self.results[self.key]['batteries']], label = 'charging_power')
-        # plt.plot(timeline, [sum(x.values()) + y['input_power'] for x, y in zip(self.results[self.key]['load_power'], self.results[self.key]['batteries'])], label = 'loads_power')
-        plt.plot(timeline, self.results[self.key]['diss_power'], label = 'diss_power')
-        plt.title('Dissipated Power')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Power (W)')
-        # plt.legend()
-        plt.savefig(os.path.join(self.output_folder, self.key + '.jpg'))
+    @stats.timed('plot')
+    def plot_thermal(self, close: bool = None):
+        from . import plotting
+        plt = plotting.pyplot()
+        if close is None:
+            close = plotting.headless()
+        with plotting.style():
+            fig = plt.figure(figsize=(30, 10))
+            plotting.draw_thermal(plt.gca(), self.results[self.key].edges(), self.__values('diss_power'), self.fidelity)
+            plt.savefig(os.path.join(self.output_folder, self.key + '.jpg'))
+            if close:
+                plt.close(fig)
 
     def step(self, timestep=1):
+        # one row of timestep seconds into results[key], same engine as day()
+        static = self.__static(timestep)
+        self.__step(static, 0, timestep)
+        for comp in self.solar_panels + self.components + self.heaters:
+            comp.advance(timestep)
+
+    def __static(self, n):
+        # time-only loads for the next n seconds, precomputed per voltage rail
+        params = SystemParameters()
+        factor = 2 - params.converters_efficiency
+
+        input_power = np.zeros(n)
+        for solar_panel in self.solar_panels:
+            input_power += solar_panel.profile(n) * params.solar_efficiency
+
+        load_power = dict()
+        for comp in self.components + self.heaters:
+            load_power.setdefault(comp.voltage, np.zeros(n))
+            load_power[comp.voltage] += comp.profile(n) * factor
+
+        h_power = np.zeros(n)
+        for h in self.heaters:
+            h_power += h.profile(n) * factor
+
+        if self.heaters:
+            heaters_status = self.heaters[0].profile(n) > 0
+        else:
+            heaters_status = np.zeros(n, dtype=bool)
+
+        columns = [input_power, h_power, heaters_status] + list(load_power.values())
+        changes = np.zeros(max(n - 1, 0), dtype=bool)
+        for column in columns:
+            changes |= column[1:] != column[:-1]
+
+        return {
+            'changes': (np.flatnonzero(changes) + 1).tolist(),
+            'input_power': input_power.tolist(),
+            'load_power': {key: value.tolist() for key, value in load_power.items()},
+            'heaters_power': h_power.tolist(),
+            'heaters_status': heaters_status.tolist(),
+        }
 
-            params = SystemParameters()
-
-            input_power = 0
-            load_power = {
-                'Vbat': 0,
-                12: 0,
-                5: 0,
-                3.3: 0,
-            }
-            load_current = {
-                'Vbat': 0,
-                12: 0,
-                5: 0,
-                3.3: 0,
-            }
-            batteries = {
-                'input_power': 0,
-                'output_power': 0,
-                'SOC': 0,
-                'DOD': 0,
-            }
-            diss_power = 0
-            h_power = 0
-            ttc_power = 0
-
-            for solar_panel in self.solar_panels:
-                solar_panel.step(timestep)
-                input_power += solar_panel.output * params.solar_efficiency
-            comps = list()
-            comps += self.components + self.ttcs + self.heaters + [self.payload]
-            for comp in comps:
-                comp.step(timestep)
-                load_power[comp.voltage] += comp.input * (2 - params.converters_efficiency)
-            for key, value in load_power.items():
-                if type(key) == int or type(key) == float:
-                    load_current[key] = value / key 
-            for h in self.heaters:
-                h_power += h.input * (2 - params.converters_efficiency)
-            for ttc in self.ttcs:
-                ttc_power += ttc.input * (2 - params.converters_efficiency)
-
-            if self.payload.status == 'transfer':
-                for ttc in self.ttcs:
-                    if ttc.mode == 'S-band':
-                        ttc.data = self.payload.output_data      
-
-            power = input_power - sum(load_power.values())
-            n_packs = len(self.battery_packs)
-            
-            for battery_pack in self.battery_packs:
-                battery_pack.step(power/n_packs, timestep)
-                batteries['input_power'] += battery_pack.input
-                batteries['output_power'] += battery_pack.output
-                soc = battery_pack.soc
-
-            batteries['SOC'] += soc
-            batteries['DOD'] = 1 - batteries['SOC'] 
-
-            if power > 0:
-                diss_power = input_power - sum(load_power.values()) - batteries['input_power']
-            else:
-                diss_power = 0
-
-            self.results[self.key]['input_power'].append(input_power)
-            self.results[self.key]['total_load_power'].append(sum(load_power.values()))
-            self.results[self.key]['load_power'].append(load_power)
-            self.results[self.key]['load_current'].append(load_current)
-            self.results[self.key]['batteries'].append(batteries)
-            self.results[self.key]['diss_power'].append(diss_power)
-
-            self.results[self.key]['payload_status'].append(self.payload.status)
-            self.results[self.key]['batteries_status'].append(self.battery_packs[0].status)
+    def __state(self):
+        state = [self.payload.status, self.payload.next_status]
+        for ttc in self.ttcs:
+            state += [ttc.status, ttc.next_status, ttc.data < 0]
+        for battery_pack in self.battery_packs:
+            state.append(battery_pack.status)
+        return state
+
+    def __advance(self, static, t, max_time):
+        # in event mode, batch the steps over which nothing can change
+        n = 1
+        if self.__mode == 'event':
+            state = self.__state()
+            if state == self.__last:
+                changes = static['changes']
+                c = bisect_right(changes, t - 1)
+                ticks = [changes[c] - t if c < len(changes) else max_time - t, self.payload.horizon()]
+                ticks += [comp.horizon() for comp in self.ttcs + self.battery_packs]
+                n = int(min(max(min(ticks), 1), max_time - t))
+            self.__step(static, t, n)
+            after = self.__state()
+            self.__last = after if after == state else None
+        else:
+            self.__step(static, t, n)
+        return n
+
+    def __step(self, static, t, timestep=1):
+        # stateful parts only, time-only loads come from __static
+        params = SystemParameters()
+        factor = 2 - params.converters_efficiency
+
+        t += timestep - 1
+        input_power = static['input_power'][t]
+        load_power = {
+            'Vbat': 0,
+            12: 0,
+            5: 0,
+            3.3: 0,
+        }
+        load_current = {
+            'Vbat': 0,
+            12: 0,
+            5: 0,
+            3.3: 0,
+        }
+        batteries = {
+            'input_power': 0,
+            'output_power': 0,
+            'SOC': 0,
+            'DOD': 0,
+        }
+        for key, value in static['load_power'].items():
+            load_power[key] += value[t]
+        h_power = static['heaters_power'][t]
+        ttc_power = 0
+
+        comps = self.ttcs + [self.payload]
+        for comp in comps:
+            comp.step(timestep)
+            load_power[comp.voltage] += comp.input * factor
+        for key, value in load_power.items():
+            if type(key) == int or type(key) == float:
+                load_current[key] = value / key
+        for ttc in self.ttcs:
+            ttc_power += ttc.input * factor
+
+        if self.payload.status == 'transfer':
             for ttc in self.ttcs:
                 if ttc.mode == 'S-band':
-                    self.results[self.key]['S-band_status'].append(ttc.status)
-                elif ttc.mode == 'UHF':
-                    self.results[self.key]['UHF_status'].append(ttc.status)
-            if self.heaters[0].input > 0:
-                heaters_status = 'active'
-            else:
-                heaters_status = 'inactive'
-            self.results[self.key]['heaters_status'].append(heaters_status)
-
-            self.results[self.key]['heaters_power'].append(h_power)
-            self.results[self.key]['ttc_power'].append(ttc_power)
+                    ttc.data = self.payload.output_data
+
+        total_load_power = sum(load_power.values())
+        power = input_power - total_load_power
+        n_packs = len(self.battery_packs)
+
+        for battery_pack in self.battery_packs:
+            battery_pack.step(power/n_packs, timestep)
+            batteries['input_power'] += battery_pack.input
+            batteries['output_power'] += battery_pack.output
+            soc = battery_pack.soc
+
+        batteries['SOC'] += soc
+        batteries['DOD'] = 1 - batteries['SOC']
+
+        if power > 0:
+            diss_power = power - batteries['input_power']
+        else:
+            diss_power = 0
+
+        results = self.results[self.key]
+        results['input_power'].append(input_power)
+        results['total_load_power'].append(total_load_power)
+        results['load_power'].append(load_power)
+        results['load_current'].append(load_current)
+        results['batteries'].append(batteries)
+        results['diss_power'].append(diss_power)
+        results['duration'].append(timestep)
+
+        results['payload_status'].append(self.payload.status)
+        results['batteries_status'].append(self.battery_packs[0].status)
+        for ttc in self.ttcs:
+            if ttc.mode == 'S-band':
+                results['S-band_status'].append(ttc.status)
+            elif ttc.mode == 'UHF':
+                results['UHF_status'].append(ttc.status)
+        if static['heaters_status'][t]:
+            heaters_status = 'active'
+        else:
+            heaters_status = 'inactive'
+        results['heaters_status'].append(heaters_status)
+
+        results['heaters_power'].append(h_power)
+        results['ttc_power'].append(ttc_power)
@@ -0,0 +1,83 @@
+import itertools
+import numpy as np
+
+from .parameters import BatteryCellParameters
+from .experiment import Experiment
+
+tasks = ['acquisition', 'transfer', 'download']
+
+
+def sequences(max_tasks: int = 3):
+    result = list()
+    for n in range(max_tasks + 1):
+        result += [list(x) for x in itertools.product(tasks, repeat=n)]
+    return result
+
+
+def fingerprint(experiment: Experiment):
+    # scalar component state only, the timelines are shared by every branch
+    state = list()
+    for saved in experiment.snapshot()['components']:
+        state.append(tuple((k, v) for k, v in saved.items()
+                           if isinstance(v, (int, float, str, bool, np.floating))))
+    return tuple(state)
+
+
+def score(experiment: Experiment):
+    downloaded = 0
+    queued = experiment.payload.raw_data + experiment.payload.processed_data
+    for ttc in experiment.ttcs:
+        if ttc.mode == 'S-band':
+            downloaded += ttc.total_downloaded
+            queued += max(ttc.data, 0)
+    # data still on board breaks ties while nothing has been downloaded yet
+    return (downloaded, queued)
+
+
+def search(experiment: Experiment,
+           n_days: int,
+           first_day: int = 1,
+           max_tasks: int = 3,
+           beam_width: int = 4,
+           max_DOD: float = None,
+           mode: str = 'event'):
+    """Beam search over per-day task sequences, maximizing S-band data downloaded under max_DOD.
+
+    There is no memo of day outcomes: branches that reach the same state are merged by
+    fingerprint, and the fingerprint holds the absolute time, so no (start state, schedule)
+    pair is ever simulated twice within a search.
+    """
+    if max_DOD is None:
+        max_DOD = BatteryCellParameters.max_DOD
+    candidates = sequences(max_tasks)
+
+    beam = [(experiment.fork(), dict(), 0)]
+    for d in range(first_day, first_day + n_days):
+        key = 'day_{}'.format(d)
+        # best child per end state, bounded to the beam width so few forks stay alive
+        branches = dict()
+        for parent, schedules, time in beam:
+            for schedule in candidates:
+                child = parent.fork()
+                # the DOD check and the fingerprint only need row values, not one row per second
+                end_time = child.day(key, schedule, time, mode=mode, resample=False)
+                results = child.results[key]
+                if results['batteries'].column('DOD').values.max() > max_DOD:
+                    continue
+
+                end = fingerprint(child)
+                if end not in branches or score(child) > score(branches[end][0]):
+                    branches[end] = (child, dict(schedules, **{key: schedule}), end_time)
+                    if len(branches) > beam_width:
+                        del branches[min(reversed(branches), key=lambda x: score(branches[x][0]))]
+
+        if not branches:
+            raise ValueError('no schedule keeps the DOD under max_DOD on {}, {} days planned'.format(key, d - first_day))
+        beam = sorted(branches.values(), key=lambda x: score(x[0]), reverse=True)
+
+    best, schedules, _ = beam[0]
+    if mode == 'event':
+        # one row per second in the returned run, as day() gives by default
+        for key in schedules:
+            best.results[key] = best.results[key].resample()
+    return schedules, best
@@ -0,0 +1,143 @@
+from multiprocessing import Pool
+
+import os
+import math
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from .utils import downsample
+
+fontsize = 30
+
+
+def pyplot():
+    # pyplot is only needed by the interactive Experiment methods
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def headless():
+    # figures drawn on a non-interactive backend are never shown, only saved
+    return matplotlib.get_backend().lower() in ('agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template')
+
+
+def style():
+    return matplotlib.rc_context({'font.size': fontsize})
+
+
+def label(name):
+    if type(name) == str:
+        return name
+    return '_'.join([name[0], str(name[1])])
+
+
+def layout(n: int, max_col: int = 3):
+    n_x = math.ceil(n/max_col)
+    n_y = n - max_col * (n_x - 1)
+    figsize = (n_y*20, 10*n_x)
+    return n_x, n_y, figsize
+
+
+def points(ax, fidelity):
+    if fidelity is None:
+        return None
+    return int(ax.bbox.width * fidelity)
+
+
+def steps(timeline, values):
+    # timeline holds the row edges, the last value is repeated to close the final step
+    values = np.asarray(values, dtype=float)
+    return np.asarray(timeline), np.append(values, values[-1:])
+
+
+def draw(ax, timeline, name, values, xmax, fidelity = 1):
+    if type(name) == str:
+        ax.set_ylabel('Power (W)', fontsize=fontsize)
+        ax.set_ylim((0, 40))
+    elif type(name) == list and len(name) == 2:
+        c = name[0]
+        n = name[1]
+        if 'power' in c:
+            ax.set_ylabel('Power (W)', fontsize=fontsize)
+            ax.set_ylim((0, 40))
+        elif 'current' in c:
+            ax.set_ylabel('Current (A)', fontsize=fontsize)
+            ax.set_ylim((0, 2))
+        elif c == 'batteries':
+            if 'power' in n:
+                ax.set_ylabel('Power (W)', fontsize=fontsize)
+                ax.set_ylim((0, 40))
+            elif n=='DOD':
+                ax.set_ylim((0.10, 0))
+            elif n=='SOC':
+                ax.set_ylim((0.9, 1))
+    # decimate only the samples inside the view, plus the first one past it to reach the edge
+    timeline, values = steps(timeline, values)
+    visible = np.searchsorted(timeline, xmax, side='right') + 1
+    ax.plot(*downsample(timeline[:visible], values[:visible], points(ax, fidelity)), drawstyle='steps-post')
+
+    ax.set_xlabel('Time (h)', fontsize=fontsize)
+    ax.set_xlim((0, xmax))
+    return label(name)
+
+
+def draw_energy(ax, solar_energy, load_energy, fidelity = 1):
+    timeline = [t for t in range(len(solar_energy))]
+    n_points = points(ax, fidelity)
+
+    ax.plot(*downsample(timeline, solar_energy, n_points), label='Solar')
+    ax.plot(*downsample(timeline, load_energy, n_points), label='Loads')
+
+    ax.set_ylabel('Energy (Wh)', fontsize=fontsize)
+    ax.set_xlabel('Orbit n.', fontsize=fontsize)
+    ax.set_xlim((0, len(timeline)-1))
+    ax.set_ylim((0, 40))
+    ax.legend(loc='lower right', fontsize=fontsize)
+
+
+def draw_thermal(ax, timeline, diss_power, fidelity = 1):
+    ax.plot(*downsample(*steps(timeline, diss_power), points(ax, fidelity)), label = 'diss_power', drawstyle='steps-post')
+    ax.set_title('Dissipated Power')
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Power (W)')
+
+
+def render(job: dict):
+    # one figure per job on the Agg canvas, without touching pyplot state
+    with style():
+        if job['kind'] == 'plot':
+            n_x, n_y, figsize = layout(len(job['names']), job['max_col'])
+            fig = Figure(figsize=figsize)
+            FigureCanvasAgg(fig)
+            axarr = fig.subplots(n_x, n_y, squeeze=False)
+            l_name = [job['key']]
+            for i, (name, values) in enumerate(zip(job['names'], job['values'])):
+                ax = axarr[i // job['max_col'], i % job['max_col']]
+                l_name.append(draw(ax, job['timeline'], name, values, job['xmax'], job['fidelity']))
+            path = os.path.join(job['output_folder'], '-'.join(l_name) + '.jpg')
+            fig.savefig(path, bbox_inches = 'tight', pad_inches = 0.1)
+        elif job['kind'] == 'energy':
+            fig = Figure(figsize=(20, 10))
+            FigureCanvasAgg(fig)
+            draw_energy(fig.subplots(), job['solar_energy'], job['load_energy'], job['fidelity'])
+            path = os.path.join(job['output_folder'], job['key'] + '_energy' + '.jpg')
+            fig.savefig(path, bbox_inches = 'tight', pad_inches = 0.1)
+        elif job['kind'] == 'thermal':
+            fig = Figure(figsize=(30, 10))
+            FigureCanvasAgg(fig)
+            draw_thermal(fig.subplots(), job['timeline'], job['diss_power'], job['fidelity'])
+            path = os.path.join(job['output_folder'], job['key'] + '.jpg')
+            fig.savefig(path)
+        else:
+            raise ValueError('unknown figure kind {}'.format(job['kind']))
+        fig.clear()
+    return path
+
+
+def render_all(jobs: list, processes: int = None):
+    if processes == 1:
+        return [render(job) for job in jobs]
+    with Pool(processes) as pool:
+        return pool.map(render, jobs)
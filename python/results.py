@@ -0,0 +1,274 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class Column():
+
+    def __init__(self,
+                 size: int,
+                 categories: list = None
+                 ):
+
+        # categorical columns store uint8 codes into self.categories
+        if categories is not None:
+            self.__categories = list(categories)
+            self.__codes = {c: i for i, c in enumerate(self.__categories)}
+            self.__data = np.zeros(size, dtype=np.uint8)
+        else:
+            self.__categories = None
+            self.__codes = None
+            self.__data = np.zeros(size, dtype=float)
+        self.__length = 0
+
+    @property
+    def categories(self):
+        return self.__categories
+
+    @property
+    def values(self):
+        return self.__data[:self.__length]
+
+    def __len__(self):
+        return self.__length
+
+    def append(self, value):
+        if self.__length >= len(self.__data):
+            self.__data = np.concatenate((self.__data, np.zeros_like(self.__data[:max(self.__length, 1)])))
+        if self.__codes is not None:
+            if value not in self.__codes:
+                self.__codes[value] = len(self.__categories)
+                self.__categories.append(value)
+            value = self.__codes[value]
+        self.__data[self.__length] = value
+        self.__length += 1
+
+    def repeat(self, counts, interpolate: bool = False):
+        values = np.repeat(self.values, counts)
+        if interpolate and len(values):
+            # linear ramp from the previous row's value to this row's value
+            rows = np.repeat(np.arange(len(counts)), counts)
+            starts = np.cumsum(counts) - counts
+            offset = np.arange(len(values)) - starts[rows] + 1
+            previous = np.concatenate((self.values[:1], self.values[:-1]))[rows]
+            values = previous + (values - previous) * offset / np.asarray(counts)[rows]
+        return Column.from_values(values.astype(self.__data.dtype), self.__categories)
+
+    @classmethod
+    def from_values(cls, values, categories: list = None):
+        # values holds raw codes for categorical columns
+        column = cls(0, categories)
+        column.__data = np.asarray(values, dtype=column.__data.dtype)
+        column.__length = len(column.__data)
+        return column
+
+    def view(self, start: int, stop: int):
+        return Column.from_values(self.values[start:stop], self.__categories)
+
+    def copy(self):
+        return Column.from_values(self.values.copy(), self.__categories)
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            if self.__categories is not None:
+                return [self.__categories[c] for c in self.values[t]]
+            return self.values[t]
+        if t < 0:
+            t += self.__length
+        if t < 0 or t >= self.__length:
+            raise IndexError('results index out of range')
+        if self.__categories is not None:
+            return self.__categories[self.__data[t]]
+        return float(self.__data[t])
+
+    def __iter__(self):
+        if self.__categories is not None:
+            return iter([self.__categories[c] for c in self.values])
+        return iter(self.values.tolist())
+
+
+class Row(Mapping):
+
+    def __init__(self, record, t: int):
+        self.__record = record
+        self.__t = t
+
+    def __getitem__(self, field):
+        return self.__record.column(field)[self.__t]
+
+    def __iter__(self):
+        return iter(self.__record.fields)
+
+    def __len__(self):
+        return len(self.__record.fields)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Record():
+
+    def __init__(self,
+                 size: int,
+                 fields: list
+                 ):
+
+        self.__fields = list(fields)
+        self.__columns = {field: Column(size) for field in self.__fields}
+
+    @property
+    def fields(self):
+        return self.__fields
+
+    def column(self, field):
+        return self.__columns[field]
+
+    def __len__(self):
+        return len(self.__columns[self.__fields[0]])
+
+    def append(self, row: dict):
+        for field in self.__fields:
+            self.__columns[field].append(row[field])
+
+    def repeat(self, counts, interpolate: list = ()):
+        record = Record(0, self.__fields)
+        for field in self.__fields:
+            record.__columns[field] = self.__columns[field].repeat(counts, field in interpolate)
+        return record
+
+    def view(self, start: int, stop: int):
+        record = Record(0, self.__fields)
+        for field in self.__fields:
+            record.__columns[field] = self.__columns[field].view(start, stop)
+        return record
+
+    def copy(self):
+        record = Record(0, self.__fields)
+        for field in self.__fields:
+            record.__columns[field] = self.__columns[field].copy()
+        return record
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return [Row(self, i) for i in range(len(self))[t]]
+        if t < 0:
+            t += len(self)
+        if t < 0 or t >= len(self):
+            raise IndexError('results index out of range')
+        return Row(self, t)
+
+    def __iter__(self):
+        return (Row(self, t) for t in range(len(self)))
+
+
+class Results(dict):
+
+    rails = ['Vbat', 12, 5, 3.3]
+    battery_fields = ['input_power', 'output_power', 'SOC', 'DOD']
+    statuses = {
+        'payload_status': ['idle', 'transfer', 'elaboration', 'acquisition'],
+        'batteries_status': ['idle', 'charging', 'discharging', 'dead', 'failure'],
+        'S-band_status': ['idle', 'rx', 'tx', 'rx/tx'],
+        'UHF_status': ['idle', 'rx', 'tx', 'rx/tx'],
+        'heaters_status': ['inactive', 'active'],
+    }
+
+    def __init__(self, size: int, start: int = 0):
+        super().__init__()
+        # mission second of the first row, and cached prefix sums per column
+        self.start = start
+        self.__prefixes = dict()
+        self['input_power'] = Column(size)
+        self['total_load_power'] = Column(size)
+        self['load_power'] = Record(size, self.rails)
+        self['load_current'] = Record(size, self.rails)
+        self['heaters_power'] = Column(size)
+        self['ttc_power'] = Column(size)
+        self['batteries'] = Record(size, self.battery_fields)
+        self['diss_power'] = Column(size)
+        self['duration'] = Column(size)
+        for name, categories in self.statuses.items():
+            self[name] = Column(size, categories)
+        self['solar_energy'] = list()
+        self['load_energy'] = list()
+        self['battery_input_energy'] = list()
+        self['battery_output_energy'] = list()
+
+    def resample(self):
+        # expand rows spanning several seconds into one row per second
+        counts = self['duration'].values.astype(np.int64)
+        results = Results(0, self.start)
+        for name, value in self.items():
+            if isinstance(value, Record):
+                results[name] = value.repeat(counts, ['SOC', 'DOD'] if name == 'batteries' else ())
+            elif isinstance(value, Column):
+                if len(value) == len(counts):
+                    results[name] = value.repeat(counts)
+                else:
+                    results[name] = value
+            else:
+                results[name] = list(value)
+        results['duration'] = Column.from_values(np.ones(counts.sum()))
+        return results
+
+    def times(self):
+        # seconds from start to the first second of each row
+        durations = self['duration'].values.astype(np.int64)
+        return np.cumsum(durations) - durations
+
+    def edges(self):
+        # row starts followed by the end of the last row, for step plots
+        durations = self['duration'].values.astype(np.int64)
+        return np.concatenate(([0], np.cumsum(durations)))
+
+    def view(self, start: int, stop: int):
+        # rows covering mission seconds [start, stop) of this buffer, sharing its arrays
+        seconds = np.cumsum(self['duration'].values)
+        first = np.searchsorted(seconds, start, side='right')
+        last = np.searchsorted(seconds, stop - 1, side='right') + 1
+        results = Results(0, self.start + int(seconds[first - 1]) if first > 0 else self.start)
+        for name, value in self.items():
+            if isinstance(value, (Column, Record)):
+                results[name] = value.view(first, last)
+            else:
+                results[name] = list()
+        return results
+
+    def copy(self):
+        # independent buffers, for a run that keeps appending in several branches
+        results = Results(0, self.start)
+        for name, value in self.items():
+            if isinstance(value, (Column, Record)):
+                results[name] = value.copy()
+            else:
+                results[name] = list(value)
+        return results
+
+    def column(self, name):
+        if isinstance(name, (list, tuple)):
+            return self[name[0]].column(name[1])
+        return self[name]
+
+    def __prefix(self, name):
+        key = tuple(name) if isinstance(name, list) else name
+        length = len(self['duration'])
+        if key not in self.__prefixes or self.__prefixes[key][0] != length:
+            values = self.column(name).values
+            durations = self['duration'].values
+            seconds = np.concatenate(([0], np.cumsum(durations)))
+            energy = np.concatenate(([0], np.cumsum(values * durations)))
+            self.__prefixes[key] = (length, seconds, energy, values)
+        return self.__prefixes[key][1:]
+
+    def energy(self, name, start, stop):
+        # energy in Wh of a power column between buffer seconds start and stop,
+        # both may be arrays so any set of windows costs two lookups each
+        seconds, energy, values = self.__prefix(name)
+
+        def integral(t):
+            t = np.clip(np.asarray(t), 0, seconds[-1])
+            row = np.clip(np.searchsorted(seconds, t, side='right') - 1, 0, max(len(values) - 1, 0))
+            partial = values[row] * (t - seconds[row]) if len(values) else 0
+            return energy[row] + partial
+
+        return (integral(stop) - integral(start)) / 3600
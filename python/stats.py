@@ -0,0 +1,122 @@
+from time import perf_counter
+from contextlib import contextmanager
+
+import functools
+
+# collector picked up by components and experiments built while profiling is enabled
+_active = None
+
+
+class Stats():
+
+    # component methods counted once a component is instrumented
+    methods = ['step', 'profile', 'advance', 'horizon']
+
+    def __init__(self):
+        self.phases = dict()
+        self.components = dict()
+        self.simulated = 0
+        self.__classes = dict()
+
+    def add(self, name: str, seconds: float):
+        entry = self.phases.setdefault(name, [0, 0.])
+        entry[0] += 1
+        entry[1] += seconds
+
+    @contextmanager
+    def timer(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start)
+
+    @property
+    def throughput(self):
+        # simulated seconds per wall-clock second spent in day() and mission()
+        seconds = sum(self.phases.get(name, [0, 0.])[1] for name in ['day', 'mission'])
+        return self.simulated / seconds if seconds > 0 else 0.
+
+    def instrument(self, comp):
+        # swap the component class for a subclass whose hot methods are counted,
+        # so components that are not instrumented pay nothing
+        cls = type(comp)
+        if cls in self.__classes.values():
+            return
+        if cls not in self.__classes:
+            counted = {name: self.__counter(cls.__name__, name, getattr(cls, name))
+                       for name in self.methods if hasattr(cls, name)}
+            counted['__module__'] = cls.__module__
+            self.__classes[cls] = type(cls.__name__, (cls,), counted)
+        comp.__class__ = self.__classes[cls]
+
+    def uninstrument(self, comp):
+        if type(comp) in self.__classes.values():
+            comp.__class__ = type(comp).__bases__[0]
+
+    def __counter(self, label, name, func):
+        entry = self.components.setdefault(label, dict()).setdefault(name, [0, 0.])
+
+        @functools.wraps(func)
+        def counted(comp, *args, **kwargs):
+            start = perf_counter()
+            result = func(comp, *args, **kwargs)
+            entry[0] += 1
+            entry[1] += perf_counter() - start
+            return result
+
+        return counted
+
+    def report(self):
+        return {
+            'phases': {name: {'calls': calls, 'seconds': seconds}
+                       for name, (calls, seconds) in self.phases.items()},
+            'simulated': self.simulated,
+            'throughput': self.throughput,
+            'components': {label: {name: {'calls': calls,
+                                          'seconds': seconds,
+                                          'per_call': seconds / calls if calls else 0.}
+                                   for name, (calls, seconds) in methods.items() if calls}
+                           for label, methods in self.components.items()},
+        }
+
+    def __repr__(self):
+        lines = ['{:<24}{:>10}{:>12}'.format('phase', 'calls', 'seconds')]
+        for name, (calls, seconds) in self.phases.items():
+            lines.append('{:<24}{:>10}{:>12.4f}'.format(name, calls, seconds))
+        lines.append('{:<24}{:>22.1f}'.format('throughput (s/s)', self.throughput))
+        for label, methods in self.components.items():
+            for name, (calls, seconds) in methods.items():
+                if calls:
+                    lines.append('{:<24}{:>10}{:>12.4f}'.format(label + '.' + name, calls, seconds))
+        return '\n'.join(lines)
+
+
+def enable(stats: Stats = None):
+    global _active
+    _active = stats if stats is not None else Stats()
+    return _active
+
+
+def disable():
+    global _active
+    stats, _active = _active, None
+    return stats
+
+
+def active():
+    return _active
+
+
+def timed(name: str):
+    # phase timer for methods, a no-op unless the object or the module has a collector
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            stats = getattr(self, 'stats', None) or _active
+            if stats is None:
+                return func(self, *args, **kwargs)
+            with stats.timer(name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,103 @@
+import os
+import hashlib
+import numpy as np
+
+from .parameters import MissionParameters
+
+
+class Export():
+
+    def __init__(self,
+                 path: str,
+                 cache: str = None
+                 ):
+
+        # an STK csv export, parsed once into a .npz next to it and keyed by content
+        self.__path = path
+        if cache is None:
+            cache = os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+        self.__cache = cache
+        with open(path, 'rb') as f:
+            self.__key = hashlib.sha1(f.read()).hexdigest()
+        self.__columns = None
+
+    def __getstate__(self):
+        # workers reload the columns from the cache instead of receiving them
+        return {k: v for k, v in vars(self).items() if k != '_Export__columns'}
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self.__columns = None
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def cache(self):
+        return self.__cache
+
+    @property
+    def key(self):
+        return self.__key
+
+    @property
+    def columns(self):
+        return list(self.__load().keys())
+
+    def __getitem__(self, name):
+        # UTCG time columns hold microseconds since the epoch, the rest as exported
+        return self.__load()[name]
+
+    def __len__(self):
+        columns = self.__load()
+        return len(next(iter(columns.values()))) if columns else 0
+
+    def __repr__(self):
+        return 'Export({!r})'.format(self.__path)
+
+    def __load(self):
+        if self.__columns is None:
+            name = os.path.splitext(os.path.basename(self.__path))[0]
+            file = os.path.join(self.__cache, '{}-{}.npz'.format(name, self.__key))
+            if os.path.exists(file):
+                with np.load(file) as data:
+                    self.__columns = {n: data[n] for n in data['__names__']}
+            else:
+                self.__columns = parse(self.__path)
+                save(file, dict(self.__columns, __names__=np.array(list(self.__columns))))
+        return self.__columns
+
+
+def parse(path: str):
+    import pandas as pd
+    df = pd.read_csv(path)
+    columns = dict()
+    for name in df.columns:
+        if name.endswith('(UTCG)'):
+            dt = pd.to_datetime(df[name], format=MissionParameters.date_format).values
+            columns[name] = dt.astype('datetime64[us]').astype(np.int64)
+        elif not pd.api.types.is_numeric_dtype(df[name]):
+            columns[name] = df[name].to_numpy().astype(str)
+        else:
+            columns[name] = df[name].values
+    return columns
+
+
+def save(file: str, arrays: dict):
+    # write then rename, so a reader never sees a partial file
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    temp = '{}.{}.tmp'.format(file, os.getpid())
+    with open(temp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temp, file)
+
+
+def read(path: str, cache: str = None):
+    return Export(path, cache)
+
+
+def read_folder(folder: str, cache: str = None):
+    # every csv export in folder, by file name without extension
+    return {os.path.splitext(name)[0]: Export(os.path.join(folder, name), cache)
+            for name in sorted(os.listdir(folder)) if name.endswith('.csv')}
@@ -0,0 +1,117 @@
+from multiprocessing import Pool
+
+import itertools
+
+from .parameters import *
+from .components import *
+from .experiment import Experiment
+from . import timeline
+
+# defaults mirror the EPS setup in the main notebook
+default_config = {
+    'n_solar_panels': 4,
+    'solar_n_series': 5,
+    'solar_n_parallel': 2,
+    'n_battery_packs': 2,
+    'battery_n_series': 4,
+    'battery_n_parallel': 2,
+    'starting_SOC': 0.9,
+    'EOL': False,
+    'n_heaters': 2,
+    'heater_eclipse_duration': 0.6,
+}
+
+# per-worker state set up once by the pool initializer
+_worker = dict()
+
+
+def build_experiment(data: dict, config: dict = None, output_folder = None):
+    config = dict(default_config, **(config or {}))
+    EOL = config['EOL']
+
+    solar_params = SolarCellParameters()
+    battery_params = BatteryCellParameters()
+    heater_params = HeaterParameters()
+    heater_params.eclipse_duration = config['heater_eclipse_duration']
+
+    solar_panels = [SolarPanel(solar_params, data['eclipse'],
+                               n_series=config['solar_n_series'],
+                               n_parallel=config['solar_n_parallel'],
+                               EOL=EOL)
+                    for _ in range(config['n_solar_panels'])]
+    components = ComponentBank(data['components'], data['eclipse']).rails
+    battery_packs = [BatteryPack(battery_params,
+                                 n_series=config['battery_n_series'],
+                                 n_parallel=config['battery_n_parallel'],
+                                 starting_SOC=config['starting_SOC'],
+                                 EOL=EOL)
+                     for _ in range(config['n_battery_packs'])]
+    heaters = [Heater(heater_params, data['eclipse']) for _ in range(config['n_heaters'])]
+    ttcs = [
+        TTC(TTCParameters(), mode='S-band', sunlight=True, GS_data=data['GS'], eclipse_data=data['eclipse']),
+        TTC(TTCParameters(), mode='UHF', sunlight=False, target=False, eclipse_data=data['eclipse'], target_data=data['target'])
+    ]
+    payload = Payload(PayloadParameters(), data['target'], data['eclipse'])
+
+    return Experiment(payload, solar_panels, battery_packs, ttcs, components, heaters, output_folder)
+
+
+def summary(experiment: Experiment):
+    soc = list()
+    dod = list()
+    energy_balance = list()
+    for results in experiment.results.values():
+        soc.append(results['batteries'].column('SOC').values.min())
+        dod.append(results['batteries'].column('DOD').values.max())
+        energy_balance += [s - l for s, l in zip(results['solar_energy'], results['load_energy'])]
+
+    return {
+        'min_SOC': float(min(soc)),
+        'max_DOD': float(max(dod)),
+        'energy_balance': energy_balance,
+        'downloaded': sum([ttc.total_downloaded for ttc in experiment.ttcs if ttc.mode == 'S-band']),
+    }
+
+
+def run(data: dict, config: dict, schedules: dict, skip: int = 3600 * 8, mode: str = 'event'):
+    experiment = build_experiment(data, config)
+    experiment.reset()
+    experiment.skiptime(skip)
+
+    time = 0
+    for key, schedule in schedules.items():
+        time = experiment.day(key, schedule, time, mode=mode)
+
+    return dict(config, **summary(experiment))
+
+
+def grid(parameters: dict):
+    names = list(parameters.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*parameters.values())]
+
+
+def _init_worker(data, schedules, skip, mode, store):
+    # compiled timelines are read from the parent's shared store, so workers never
+    # re-parse STK data and every worker maps the same physical pages
+    _worker.update(data=data, schedules=schedules, skip=skip, mode=mode, store=timeline.attach(store))
+
+
+def _run_worker(config):
+    return run(_worker['data'], config, _worker['schedules'], _worker['skip'], _worker['mode'])
+
+
+def sweep(parameters: dict,
+          data: dict,
+          schedules: dict,
+          skip: int = 3600 * 8,
+          mode: str = 'event',
+          processes: int = None):
+
+    configs = grid(parameters)
+
+    # compile every timeline once in the parent before starting workers
+    build_experiment(data)
+
+    with timeline.share() as store:
+        with Pool(processes, initializer=_init_worker, initargs=(data, schedules, skip, mode, store.path)) as pool:
+            return pool.map(_run_worker, configs)
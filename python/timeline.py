@@ -0,0 +1,530 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from bisect import bisect_right
+
+import os
+import pickle
+import hashlib
+import tempfile
+import numpy as np
+
+from .parameters import MissionParameters
+from . import stk
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# process-wide cache of compiled masks, keyed on data content and mission span
+_cache = dict()
+
+
+class Timeline():
+
+    def __init__(self,
+                 edges: np.ndarray,
+                 values: np.ndarray,
+                 length: int
+                 ):
+
+        # edges[i] is the first second of run i, runs hold a constant value
+        self.__edges = np.asarray(edges, dtype=np.int64)
+        self.__values = np.asarray(values, dtype=float)
+        self.__length = int(length)
+        self.__edges.setflags(write=False)
+        self.__values.setflags(write=False)
+
+        # plain lists keep scalar lookups off the numpy boxing path
+        self.__bounds = self.__edges.tolist() + [self.__length]
+        self.__items = self.__values.tolist()
+        self.__run = 0
+        self.__next = None
+
+    def __reduce__(self):
+        return (Timeline, (self.__edges, self.__values, self.__length))
+
+    def save(self, file: str):
+        stk.save(file, {'edges': self.__edges, 'values': self.__values, 'length': np.array(self.__length)})
+
+    @classmethod
+    def load(cls, file: str):
+        with np.load(file) as data:
+            return cls(data['edges'], data['values'], int(data['length']))
+
+    @classmethod
+    def from_runs(cls, values, lengths):
+        values = np.asarray(values, dtype=float)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        keep = lengths > 0
+        values = values[keep]
+        lengths = lengths[keep]
+        if len(values) == 0:
+            return cls([0], [0.], 0)
+        change = np.concatenate(([True], values[1:] != values[:-1]))
+        edges = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        return cls(edges[change], values[change], lengths.sum())
+
+    @property
+    def edges(self):
+        return self.__edges
+
+    @property
+    def values(self):
+        return self.__values
+
+    def __len__(self):
+        return self.__length
+
+    def index(self, t: int):
+        bounds = self.__bounds
+        run = self.__run
+        if bounds[run] <= t < bounds[run + 1]:
+            return run
+        if run + 2 < len(bounds) and bounds[run + 1] <= t < bounds[run + 2]:
+            self.__run = run + 1
+            return run + 1
+        run = bisect_right(bounds, t, 0, len(bounds) - 1) - 1
+        self.__run = max(run, 0)
+        return self.__run
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return self.dense()[t]
+        if t < 0:
+            t += self.__length
+        if t < 0 or t >= self.__length:
+            raise IndexError('timeline index out of range')
+        return self.__items[self.index(t)]
+
+    def next_edge(self, t: int):
+        # seconds from t to the first second holding a different value
+        run = self.index(t)
+        return self.__bounds[run + 1] - t
+
+    def next_on(self, t: int):
+        # seconds from t to the next run at 1, 0 when already inside one or none is left
+        if self.__next is None:
+            n = len(self.__items)
+            runs = np.where(self.__values == 1, np.arange(n), n)
+            runs = np.minimum.accumulate(runs[::-1])[::-1]
+            self.__next = np.where(runs < n, np.append(self.__edges, -1)[runs], -1).tolist()
+        edge = self.__next[self.index(t)]
+        if edge < 0:
+            return 0
+        return max(edge - t, 0)
+
+    def runs(self, value: float = 1):
+        # (start, stop) seconds of every run holding value
+        bounds = np.asarray(self.__bounds)
+        keep = self.__values == value
+        return np.column_stack((bounds[:-1][keep], bounds[1:][keep]))
+
+    def lookup(self, times):
+        times = np.asarray(times, dtype=np.int64)
+        runs = np.searchsorted(self.__edges, times, side='right') - 1
+        return self.__values[np.clip(runs, 0, None)]
+
+    def segment(self, start: int, stop: int, fill: float = 0):
+        # dense values for [start, stop), seconds past the end read as fill
+        out = np.full(stop - start, fill, dtype=float)
+        end = min(stop, self.__length)
+        if end > start:
+            first = np.searchsorted(self.__edges, start, side='right') - 1
+            last = np.searchsorted(self.__edges, end - 1, side='right') - 1
+            bounds = np.clip(self.__edges[first:last + 1], start, None)
+            lengths = np.diff(np.append(bounds, end))
+            out[:end - start] = np.repeat(self.__values[first:last + 1], lengths)
+        return out
+
+    def dense(self):
+        lengths = np.diff(self.__bounds)
+        return np.repeat(self.__values, lengths)
+
+    def combine(self, others: list, func, fill: float = 0):
+        timelines = [self] + list(others)
+        length = max(len(timeline) for timeline in timelines)
+        edges = np.unique(np.concatenate([timeline.edges for timeline in timelines]))
+        edges = np.union1d(edges, [len(timeline) for timeline in timelines if len(timeline) < length])
+        columns = [np.where(edges < len(timeline), timeline.lookup(edges), fill) for timeline in timelines]
+        values = func(*columns)
+        lengths = np.diff(np.append(edges, length))
+        return Timeline.from_runs(values, lengths)
+
+
+class OrbitIndex():
+
+    def __init__(self, sunvec: Timeline):
+        # an orbit runs from one eclipse entry to the next, adjacent umbra and
+        # penumbra rows are already merged into one eclipse run by the timeline
+        eclipses = sunvec.runs(0)
+        # an eclipse already in progress at mission second 0 has no entry, so the
+        # first orbit starts at the first complete eclipse and earlier seconds belong to none
+        if len(eclipses) and eclipses[0, 0] == 0:
+            eclipses = eclipses[1:]
+        self.__starts = eclipses[:-1, 0]
+        self.__stops = eclipses[1:, 0]
+        self.__eclipse = eclipses[:-1, 1] - eclipses[:-1, 0]
+        self.__sunlight = self.__stops - eclipses[:-1, 1]
+
+    @property
+    def starts(self):
+        return self.__starts
+
+    @property
+    def stops(self):
+        return self.__stops
+
+    @property
+    def eclipse(self):
+        return self.__eclipse
+
+    @property
+    def sunlight(self):
+        return self.__sunlight
+
+    @property
+    def periods(self):
+        return self.__stops - self.__starts
+
+    def __len__(self):
+        return len(self.__starts)
+
+    def orbit(self, t: int):
+        # -1 before the first eclipse entry
+        return int(np.searchsorted(self.__starts, t, side='right')) - 1
+
+    def windows(self, start: int, stop: int):
+        # (start, stop) of the orbits overlapping [start, stop), clipped to it
+        first = max(self.orbit(start), 0)
+        last = self.orbit(stop - 1) + 1
+        windows = np.column_stack((self.__starts[first:last], self.__stops[first:last]))
+        return np.clip(windows, start, stop)
+
+
+class Coverage():
+
+    def __init__(self, timelines: list):
+        # sweep over the start/stop events of every station's access runs,
+        # so cost follows the number of passes rather than stations x seconds
+        self.__timelines = list(timelines)
+        self.__length = max([len(timeline) for timeline in self.__timelines] + [0])
+        self.__runs = [timeline.runs(1) for timeline in self.__timelines]
+
+        runs = np.concatenate([np.zeros((0, 2), dtype=np.int64)] + self.__runs)
+        times = np.concatenate((runs[:, 0], runs[:, 1]))
+        deltas = np.concatenate((np.ones(len(runs)), -np.ones(len(runs))))
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        counts = np.cumsum(deltas[order])
+
+        # stations in view after the last event at each distinct time
+        last = np.append(times[1:] != times[:-1], True) if len(times) else np.zeros(0, dtype=bool)
+        edges = np.concatenate(([0], times[last]))
+        counts = np.concatenate(([0.], counts[last]))
+        keep = edges < self.__length
+        edges = edges[keep]
+        counts = counts[keep]
+        self.__count = Timeline.from_runs(counts, np.diff(np.append(edges, self.__length)))
+
+    @property
+    def count(self):
+        # number of stations in view at every second
+        return self.__count
+
+    def __len__(self):
+        return len(self.__timelines)
+
+    def timeline(self, min_stations: int = 1):
+        # 1 where at least min_stations stations are in view
+        bounds = np.append(self.__count.edges, len(self.__count))
+        return Timeline.from_runs((self.__count.values >= min_stations).astype(float), np.diff(bounds))
+
+    def union(self):
+        return self.timeline(1)
+
+    def intersection(self):
+        return self.timeline(len(self.__timelines))
+
+    def stations(self, t: int):
+        # indices of the stations in view at second t
+        return [i for i, timeline in enumerate(self.__timelines) if t < len(timeline) and timeline[t] == 1]
+
+    def attribution(self, min_stations: int = 1):
+        # merged windows and, for each, which stations contribute to it
+        windows = self.timeline(min_stations).runs(1)
+        matrix = np.zeros((len(windows), len(self.__timelines)), dtype=bool)
+        for i, runs in enumerate(self.__runs):
+            first = np.searchsorted(windows[:, 1], runs[:, 0], side='right')
+            last = np.searchsorted(windows[:, 0], runs[:, 1], side='left')
+            overlap = first < last
+            marks = np.zeros(len(windows) + 1)
+            np.add.at(marks, first[overlap], 1)
+            np.add.at(marks, last[overlap], -1)
+            matrix[:, i] = np.cumsum(marks)[:-1] > 0
+        return windows, matrix
+
+
+class TimelineStore():
+
+    def __init__(self, path: str):
+        # read-only view of a store file, the arrays of every timeline are slices of
+        # one np.memmap so all processes attached to it share the same pages
+        self.__path = path
+        with open(path, 'rb') as f:
+            size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            self.__index = pickle.loads(f.read(size))
+        self.__start = TimelineStore.__align(8 + size)
+        self.__data = np.memmap(path, dtype=np.uint8, mode='r')
+
+    @staticmethod
+    def __align(n):
+        return -(-n // 8) * 8
+
+    @classmethod
+    def create(cls, path: str, timelines: dict):
+        # layout: header size, pickled {key: (offset, runs, length)} for a Timeline or
+        # {key: (offset, dtype, length)} for a dense array, padding to 8 bytes,
+        # then the edges and values of each timeline and the 8-byte aligned arrays
+        index = dict()
+        offset = 0
+        for key, value in timelines.items():
+            if isinstance(value, Timeline):
+                index[key] = (offset, len(value.edges), len(value))
+                offset += 16 * len(value.edges)
+            else:
+                index[key] = (offset, value.dtype.str, len(value))
+                offset += TimelineStore.__align(value.nbytes)
+        header = pickle.dumps(index)
+        start = TimelineStore.__align(8 + len(header))
+
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'wb') as f:
+            f.write(np.uint64(len(header)).tobytes())
+            f.write(header)
+            f.write(bytes(start - 8 - len(header)))
+            for key, value in timelines.items():
+                if isinstance(value, Timeline):
+                    f.write(value.edges.astype(np.int64).tobytes())
+                    f.write(value.values.astype(float).tobytes())
+                else:
+                    f.write(np.ascontiguousarray(value).tobytes())
+                    f.write(bytes(TimelineStore.__align(value.nbytes) - value.nbytes))
+        os.replace(temp, path)
+        return cls(path)
+
+    @property
+    def path(self):
+        return self.__path
+
+    def keys(self):
+        return self.__index.keys()
+
+    def __len__(self):
+        return len(self.__index)
+
+    def __contains__(self, key):
+        return key in self.__index
+
+    def __getitem__(self, key):
+        offset, n, length = self.__index[key]
+        offset += self.__start
+        if isinstance(n, str):
+            dtype = np.dtype(n)
+            return self.__data[offset:offset + dtype.itemsize * length].view(dtype)
+        edges = self.__data[offset:offset + 8 * n].view(np.int64)
+        values = self.__data[offset + 8 * n:offset + 16 * n].view(float)
+        return Timeline(edges, values, length)
+
+    def timelines(self):
+        return {key: self[key] for key in self.__index}
+
+    def unlink(self):
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.unlink()
+
+
+def datakey(data: pd.DataFrame, columns: list = None):
+    if isinstance(data, stk.Export):
+        return data.key
+    import pandas as pd
+    if columns is None:
+        columns = ['Start Time (UTCG)', 'Stop Time (UTCG)']
+    hashes = pd.util.hash_pandas_object(data[columns], index=False).values
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+def missionkey():
+    missionparameters = MissionParameters()
+    return (missionparameters.dt_mission_start, missionparameters.dt_mission_end)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def preload(timelines: dict):
+    _cache.update(timelines)
+
+
+def share(path: str = None):
+    # write every cached Timeline and attitude array to a store file, in RAM-backed /dev/shm
+    # when there is one; Coverage and OrbitIndex objects are rebuilt in each worker on demand
+    if path is None:
+        folder = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        path = os.path.join(folder, 'timelines-{}-{}.bin'.format(os.getpid(), id(_cache)))
+    timelines = {key: value for key, value in _cache.items() if isinstance(value, (Timeline, np.ndarray))}
+    return TimelineStore.create(path, timelines)
+
+
+def attach(path: str):
+    # load the cache with timelines and arrays that point into the shared store
+    store = TimelineStore(path)
+    preload(store.timelines())
+    return store
+
+
+def _cached(key, build, data=None):
+    # timelines and attitude arrays of an stk.Export are also kept on disk next to its parsed columns
+    if key not in _cache:
+        if isinstance(data, stk.Export):
+            digest = hashlib.sha1(repr(key).encode()).hexdigest()
+            file = os.path.join(data.cache, 'timeline-{}.npz'.format(digest))
+            array = os.path.join(data.cache, 'array-{}.npz'.format(digest))
+            if os.path.exists(file):
+                _cache[key] = Timeline.load(file)
+            elif os.path.exists(array):
+                with np.load(array) as saved:
+                    value = saved['array']
+                value.setflags(write=False)
+                _cache[key] = value
+            else:
+                _cache[key] = build()
+                if isinstance(_cache[key], np.ndarray):
+                    stk.save(array, {'array': _cache[key]})
+                else:
+                    _cache[key].save(file)
+        else:
+            _cache[key] = build()
+    return _cache[key]
+
+
+def _microseconds(column):
+    if isinstance(column, np.ndarray) and column.dtype == np.int64:
+        return column
+    import pandas as pd
+    date_format = MissionParameters.date_format
+    dt = pd.to_datetime(column, format=date_format).values
+    return dt.astype('datetime64[us]').astype(np.int64)
+
+
+def _seconds(delta):
+    # whole seconds of each gap, truncated the same way as timedelta.seconds
+    return (delta // 1000000) % 86400
+
+
+def intervals(data: pd.DataFrame):
+    missionparameters = MissionParameters()
+    mission_start = np.datetime64(missionparameters.dt_mission_start, 'us').astype(np.int64)
+    mission_end = np.datetime64(missionparameters.dt_mission_end, 'us').astype(np.int64)
+
+    start = _microseconds(data['Start Time (UTCG)'])
+    stop = _microseconds(data['Stop Time (UTCG)'])
+    last = np.concatenate(([mission_start], stop))
+
+    gaps = start - last[:-1]
+    durations = _seconds(stop - start)
+    tail = _seconds(mission_end - last[-1])
+    return gaps, durations, tail
+
+
+def _compile(data, inside, outside):
+    gaps, durations, tail = intervals(data)
+    lengths = np.column_stack((_seconds(gaps), durations)).ravel()
+    values = np.tile([outside, inside], len(durations))
+    return Timeline.from_runs(np.append(values, 0.), np.append(lengths, tail))
+
+
+def sunlight(eclipse_data: pd.DataFrame):
+    key = ('sunlight', datakey(eclipse_data)) + missionkey()
+    return _cached(key, lambda: _compile(eclipse_data, 0, 1), eclipse_data)
+
+
+def access(access_data: pd.DataFrame):
+    key = ('access', datakey(access_data)) + missionkey()
+    return _cached(key, lambda: _compile(access_data, 1, 0), access_data)
+
+
+def coverage(access_data: list):
+    key = ('coverage',) + tuple(datakey(data) for data in access_data) + missionkey()
+    return _cached(key, lambda: Coverage([access(data) for data in access_data]))
+
+
+def network(access_data: list, min_stations: int = 1):
+    # 1 where at least min_stations of the stations are in view, 1 is the union
+    key = ('network', min_stations) + tuple(datakey(data) for data in access_data) + missionkey()
+    return _cached(key, lambda: coverage(access_data).timeline(min_stations), access_data[0])
+
+
+def attitude(angle_data: pd.DataFrame, face: str, column: str = None):
+    # per-second projection factor of a body-mounted face, as float32 over the mission;
+    # angles are interpolated to 1 s from the export's UTCG time column when it has one
+    # both faces derive from the x direction angle of the export by default
+    if column is None:
+        column = 'DirectionAngle x (deg)'
+    times = [name for name in angle_data.columns if name.endswith('(UTCG)')][:1]
+    key = ('attitude', datakey(angle_data, times + [column]), face, column) + missionkey()
+
+    def build():
+        angles = np.deg2rad(np.asarray(angle_data[column], dtype=float))
+        if times:
+            missionparameters = MissionParameters()
+            mission_start = np.datetime64(missionparameters.dt_mission_start, 'us').astype(np.int64)
+            seconds = (_microseconds(angle_data[times[0]]) - mission_start) / 1e6
+            length = int((missionparameters.dt_mission_end - missionparameters.dt_mission_start).total_seconds())
+            angles = np.interp(np.arange(length), seconds, angles)
+        if face == 'z':
+            projection = np.sin(angles)
+        elif face == 'x':
+            projection = np.where(angles < np.pi/2, np.cos(angles), np.cos(angles + np.pi))
+        else:
+            raise ValueError('face need to be track, x or z')
+        projection = projection.astype(np.float32)
+        projection.setflags(write=False)
+        return projection
+
+    return _cached(key, build, angle_data)
+
+
+def heating(eclipse_data: pd.DataFrame, eclipse_duration: float, sun_duration: float):
+    key = ('heating', datakey(eclipse_data), eclipse_duration, sun_duration) + missionkey()
+
+    def build():
+        gaps, durations, tail = intervals(eclipse_data)
+        sun = _seconds(gaps)
+
+        sun_on = np.floor(sun * sun_duration).astype(np.int64) if sun_duration > 0 else np.zeros_like(sun)
+        sun_off = sun - sun_on
+        if eclipse_duration > 0:
+            long = durations > 10
+            act = np.where(long, np.floor(durations * eclipse_duration).astype(np.int64), 0)
+            # short penumbra rows keep whatever state the heater was already in
+            last = np.where(long, (act > 0).astype(float), np.nan)
+            after_sun = ~long & (gaps != 0)
+            last[after_sun] = np.where(sun_off[after_sun] > 0, 0., (sun_on[after_sun] > 0).astype(float))
+            filled = np.where(np.isnan(last), 0, np.arange(len(last)))
+            last = np.nan_to_num(last[np.maximum.accumulate(filled)])
+            act = np.where(long, act, durations * last.astype(np.int64))
+        else:
+            act = np.zeros_like(durations)
+        eclipse_off = durations - act
+
+        lengths = np.column_stack((sun_on, sun_off, eclipse_off, act)).ravel()
+        values = np.tile([1., 0., 0., 1.], len(durations))
+        return Timeline.from_runs(np.append(values, 0.), np.append(lengths, tail))
+
+    return _cached(key, build, eclipse_data)
@@ -1,8 +1,10 @@
-import pandas as pd
+import math
+import numpy as np
 
 from .parameters import ComponentParameters
 
 def csvtoparameters(file_path):
+    import pandas as pd
     df = pd.read_csv(file_path)
 
     parameters_list = list()
@@ -20,3 +22,22 @@ def csvtoparameters(file_path):
         parameters_list.append(param)
 
     return parameters_list
+
+def downsample(x, y, n_points):
+    # keep the min and max of each bucket so SOC dips and TX spikes survive decimation
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if n_points is None or len(y) <= n_points:
+        return x, y
+
+    n_buckets = max(int(n_points) // 2, 1)
+    size = math.ceil(len(y) / n_buckets)
+    n_buckets = math.ceil(len(y) / size)
+    padded = np.concatenate((y, np.full(n_buckets * size - len(y), y[-1])))
+    buckets = padded.reshape(n_buckets, size)
+    offset = np.arange(n_buckets) * size
+    idx = np.concatenate((offset + buckets.argmin(axis=1),
+                          offset + buckets.argmax(axis=1),
+                          [0, len(y) - 1]))
+    idx = np.unique(np.clip(idx, 0, len(y) - 1))
+    return x[idx], y[idx]